@@ -0,0 +1,156 @@
+"""
+Throughput benchmarks of the pyxfoil driver against the fake XFOIL in fakexfoil.py
+
+usage: python benchmarks/bench.py [--save] [--tolerance 0.25] [benchmark ...]
+
+Results are compared with benchmarks/baseline.json, and the exit status is 1 if
+any benchmark is worse than its baseline by more than tolerance.  --save
+records the results as the new baseline.  Baselines depend on the machine, so
+record them on the machine the comparisons are made on.
+"""
+import sys, os, time, json, shutil, tempfile, platform
+
+benchdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(benchdir), 'pyxfoil'))
+import pyxfoil, parallel, polarfile
+
+baseline_file = os.path.join(benchdir, 'baseline.json')
+airfoils = ['0012', '2412', '4412']
+res = [1e5, 3e5, 1e6]
+
+def setup():
+    """
+    Makes a run directory with logs/ and savedpolars/, and puts an xfoil
+    running fakexfoil.py first on PATH, so sessions and workers find it
+    """
+    run_dir = tempfile.mkdtemp(prefix='pyxfoil_bench')
+    for d in ['logs', 'savedpolars', 'bin']:
+        os.mkdir(os.path.join(run_dir, d))
+    config = os.path.join(run_dir, 'fakexfoil.json')
+    json.dump({'fail_rate': 0.05, 'seed': 1}, open(config, 'w'))
+    shim = os.path.join(run_dir, 'bin', 'xfoil')
+    open(shim, 'w').write('#!/bin/sh\nexec "%s" "%s" "%s"\n' % (sys.executable, os.path.join(benchdir, 'fakexfoil.py'), config))
+    os.chmod(shim, 0755)
+    os.environ['PATH'] = os.path.join(run_dir, 'bin') + os.pathsep + os.environ['PATH']
+    return run_dir
+
+def clear(run_dir):
+    polardir = os.path.join(run_dir, 'savedpolars')
+    for name in os.listdir(polardir):
+        os.remove(os.path.join(polardir, name))
+
+def sweep(run_dir, **polar_args):
+    clear(run_dir)
+    xf = pyxfoil.session(run_dir=run_dir, force_zero=True)
+    start = time.time()
+    for naca in airfoils:
+        xf.naca(naca)
+        for re in res:
+            xf.set_re(re)
+            xf.generate_polar(filename=parallel.polarname(naca, re), **polar_args)
+    seconds = time.time() - start
+    xf.quit()
+    return len(airfoils)*len(res)/seconds
+
+def bench_sweep(run_dir):
+    return sweep(run_dir), 'polars/s', True
+
+def bench_sweep_batch(run_dir):
+    return sweep(run_dir, batch=8), 'polars/s', True
+
+def bench_sweep_adaptive(run_dir):
+    return sweep(run_dir, adaptive=True, alfa_step=2.), 'polars/s', True
+
+def bench_psweep(run_dir):
+    clear(run_dir)
+    jobs = [{'airfoil': naca, 're': re, 'polarname': parallel.polarname(naca, re), 'kwargs': {}}
+            for naca in airfoils for re in res]
+    start = time.time()
+    for result in parallel.run(jobs, workers=2, cwd=run_dir, logfile='bench'):
+        pass
+    return len(jobs)/(time.time() - start), 'polars/s', True
+
+def bench_restart(run_dir, restarts=5):
+    start = time.time()
+    for _ in range(restarts):
+        xf = pyxfoil.session(run_dir=run_dir)
+        xf.naca('2412')
+        xf.set_panels(200)
+        xf.force_quit()
+    return (time.time() - start)/restarts, 's/restart', False
+
+def bench_parse(run_dir, repeats=2000):
+    xf = pyxfoil.session(run_dir=run_dir)
+    xf.naca('2412')
+    xf.set_re(1e6)
+    xf.alfa(2.0)
+    single = xf.proc.before
+    xf.aseq(0, 7, .5)
+    sequence = xf.proc.before
+    xf.quit()
+    start = time.time()
+    for _ in range(repeats):
+        pyxfoil.output(single).values
+    for _ in range(repeats/15):
+        for out in pyxfoil.split_outputs(sequence):
+            out.values
+    return 2*repeats/(time.time() - start), 'outputs/s', True
+
+def bench_read_polars(run_dir, polars=500):
+    sweep(run_dir)
+    polardir = os.path.join(run_dir, 'savedpolars')
+    names = sorted(os.listdir(polardir))
+    for i in range(polars):
+        shutil.copyfile(os.path.join(polardir, names[i % len(names)]), os.path.join(polardir, 'copy%04d.pol' % i))
+    start = time.time()
+    polarfile.read_dir(polardir)
+    return (polars + len(names))/(time.time() - start), 'polars/s', True
+
+benchmarks = [('sweep', bench_sweep), ('sweep_batch', bench_sweep_batch), ('sweep_adaptive', bench_sweep_adaptive),
+              ('psweep', bench_psweep), ('restart', bench_restart), ('parse', bench_parse), ('read_polars', bench_read_polars)]
+
+def compare(results, baseline, tolerance):
+    """Prints each result against its baseline; returns the names of benchmarks that regressed"""
+    regressed = []
+    for name, (value, unit, higher) in sorted(results.items()):
+        line = name.ljust(16) + ('%.4g' % value).rjust(10) + ' ' + unit
+        if name in baseline['results']:
+            base = baseline['results'][name][0]
+            change = (value - base)/base if higher else (base - value)/base
+            line += '  (baseline %.4g, %+.1f%%)' % (base, 100*change)
+            if change < -tolerance:
+                line += '  REGRESSION'
+                regressed.append(name)
+        print line
+    return regressed
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    save = '--save' in args
+    tolerance = 0.25
+    if '--tolerance' in args:
+        tolerance = float(args[args.index('--tolerance') + 1])
+    names = [a for a in args if not a.startswith('--') and a in dict(benchmarks)]
+    run_dir = setup()
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w') #generate_polar's progress messages
+    try:
+        results = dict()
+        for name, bench in benchmarks:
+            if not names or name in names:
+                results[name] = bench(run_dir)
+    finally:
+        sys.stdout = stdout
+        os.chdir(cwd)
+        shutil.rmtree(run_dir)
+    baseline = json.load(open(baseline_file)) if os.path.exists(baseline_file) else {'results': {}}
+    regressed = compare(results, baseline, tolerance)
+    if save:
+        baseline['results'].update(results)
+        baseline['machine'] = platform.platform() + ', ' + platform.python_version()
+        baseline['recorded'] = time.strftime('%Y-%m-%d')
+        json.dump(baseline, open(baseline_file, 'w'), indent=1, sort_keys=True)
+        print "Baseline saved to " + baseline_file
+    elif regressed:
+        sys.exit(1)
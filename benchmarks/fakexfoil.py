@@ -0,0 +1,211 @@
+"""
+Deterministic stand-in for the XFOIL executable, for benchmarking pyxfoil without XFOIL
+
+Reproduces the prompts, menus, iteration output, 'Point added' and 'Convergence failed'
+messages and PACC polar files that pyxfoil.session relies on, for NACA 4 digit and loaded
+airfoils.  Lift is linear from zero lift (-camber degrees) up to stall, then drops off.
+
+usage: python fakexfoil.py [config.json]
+
+config keys:
+    latency         seconds each solve takes
+    command_latency seconds every other command takes
+    fail_rate       fraction of solves that fail to converge, chosen by a seeded hash of airfoil, Re and alfa
+    fail            list of {'a', 're'} (either optional) that never converge
+    hang            list of {'a', 're'} (either optional) where the solve never returns
+    stall           stall angle at Re 1e4; it rises by half a degree per decade of Re
+    seed            seed of the convergence failure pattern
+"""
+import sys, os, time, json, math, hashlib
+
+config = {'latency': 0.0, 'command_latency': 0.0, 'fail_rate': 0.05, 'fail': [], 'hang': [], 'stall': 12.0, 'seed': 0}
+if len(sys.argv) > 1:
+    config.update(json.load(open(sys.argv[1])))
+
+def out(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+state = {'menu': 'XFOIL', 'airfoil': None, 'name': None, 'visc': False, 're': 0., 'mach': 0., 'iter': 20,
+         'pacc': False, 'savefile': None, 'npol': 0, 'amode': False, 'pacc_step': 0, 'prev': None}
+
+def camber(code):
+    digits = [c for c in code or '' if c.isdigit()]
+    return int(digits[0]) if digits else 0
+
+def matches(points, a):
+    for p in points:
+        if abs(p.get('a', a) - a) < 1e-6 and abs(p.get('re', state['re']) - state['re']) < 1:
+            return True
+    return False
+
+def zero_alpha():
+    return -1.0*camber(state['airfoil'])
+
+def stall():
+    return config['stall'] + 0.5*math.log10(max(state['re'], 1e4)/1e4)
+
+def rand(*key):
+    h = hashlib.md5(json.dumps([config['seed']] + list(key))).hexdigest()
+    return int(h[:8], 16)/float(0xffffffff)
+
+def coeffs(a):
+    a0, st = zero_alpha(), stall()
+    cl = 0.11*(a - a0)
+    if a > st:
+        cl = 0.11*(st - a0) - 0.06*(a - st)**2
+    cd = 0.006 + 0.0001*(a - a0)**2
+    return cl, cd, -0.02 - 0.01*camber(state['airfoil'])
+
+def converges(a):
+    if a > stall() + 4 or matches(config['fail'], a):
+        return False
+    return rand(state['airfoil'], state['re'], round(a, 3)) > config['fail_rate']
+
+def iteration(n, a, cl, cd, cm):
+    return (" Side 1  free  transition at x/c =  0.0377   %d\n"
+            "   %d   rms: 0.%04dE-%02d   max: -0.5000E-01   C at  0.9928  Side 1  Iter 1\n"
+            "       a = %6.3f      CL = %7.4f\n"
+            "      Cm = %7.4f     CD = %8.5f   =>   CDf = %8.5f    CDp = %8.5f") % (n, n, 1234, n, a, cl, cd, cm, cd*0.7, cd*0.3)
+
+def solve(a):
+    if matches(config['hang'], a):
+        time.sleep(1e6)
+    time.sleep(config['latency'])
+    cl, cd, cm = coeffs(a)
+    ok = converges(a)
+    n = 3 if ok else state['iter']
+    text = "\n\n".join(iteration(i + 1, a, cl + 0.001*(n - i - 1), cd, cm) for i in range(n))
+    if not ok:
+        text += "\n Convergence failed"
+    if state['pacc'] and ok:
+        state['npol'] += 1
+        text += "\n\n Point added to stored polar  %d\n Point written to save file  %s" % (state['npol'], state['savefile'])
+        if state['savefile']:
+            f = open(state['savefile'], 'a')
+            f.write("%8.3f%9.4f%10.5f%10.5f%9.4f%9.4f%9.4f\n" % (a, cl, cd, cd*0.3, cm, 0.9, 0.9))
+            f.close()
+    state['prev'] = a
+    return text
+
+def header():
+    re = state['re']
+    exp = int(math.floor(math.log10(re))) if re > 0 else 0
+    return ("\n       XFOIL         Version 6.99\n\n"
+            " Calculated polar for: %s\n\n"
+            " 1 1 Reynolds number fixed          Mach number fixed\n\n"
+            " xtrf =   1.000 (top)        1.000 (bottom)\n"
+            " Mach =%8.3f     Re =%10.3f e %d     Ncrit =   9.000\n\n"
+            "   alpha    CL        CD       CDp       CM     Top_Xtr  Bot_Xtr\n"
+            "  ------ -------- --------- --------- -------- -------- --------\n") % (
+                state['name'], state['mach'], re/10.**exp, exp)
+
+def oper_menu():
+    return '.OPER' + ('v' if state['visc'] else 'i') + ('a' if state['amode'] else '')
+
+def prompt():
+    menu = state['menu']
+    if menu == 'XFOIL':
+        out("\n\n XFOIL   c>  ")
+    elif menu == 'OPER':
+        out("\n\n" + oper_menu() + "   c>  ")
+    elif menu == 'PPAR':
+        out("\n\n Change what ? (<cr> if nothing else)  c>  ")
+    elif menu == 'PLOP':
+        out("\n\n Option, Value   (or <Return>)    c>  ")
+    elif menu == 'PACC1':
+        out("\n Enter  polar save filename  OR  <return> for no file   s>  ")
+    elif menu == 'PACC2':
+        out("\n Enter  polar dump filename  OR  <return> for no file   s>  ")
+
+def handle(line):
+    words = line.split()
+    cmd = words[0].lower() if words else ''
+    args = words[1:]
+    menu = state['menu']
+    if menu == 'XFOIL':
+        if cmd == 'naca':
+            code = args[0] if args else ''
+            if len(code) != 4 or not code.isdigit():
+                out("\n Enter NACA 4 or 5-digit airfoil designation   i>  ")
+                return
+            state['airfoil'] = code
+            state['name'] = 'NACA ' + code
+            out("\n Buffer airfoil set using 200 points")
+        elif cmd == 'load':
+            try:
+                name = open(args[0]).readline().strip()
+            except (IndexError, IOError):
+                out("\n LOAD NOT COMPLETED")
+                return
+            state['airfoil'] = state['name'] = name
+            out("\n Labeled airfoil file.  Name:   " + name)
+        elif cmd == 'ppar':
+            state['menu'] = 'PPAR'
+        elif cmd == 'plop':
+            state['menu'] = 'PLOP'
+        elif cmd == 'oper':
+            state['menu'] = 'OPER'
+        elif cmd == 'quit':
+            sys.exit(0)
+    elif menu in ('PPAR', 'PLOP'):
+        if cmd == '':
+            state['menu'] = 'XFOIL'
+    elif menu == 'PACC1':
+        name = line.strip()
+        if name:
+            if os.path.exists(name):
+                out("\n Old polar save file available for appending")
+            else:
+                open(name, 'w').write(header())
+        state['savefile'] = name or None
+        state['menu'] = 'PACC2'
+    elif menu == 'PACC2':
+        state['pacc'] = True
+        state['menu'] = 'OPER'
+    elif menu == 'OPER':
+        if cmd == '':
+            state['menu'] = 'XFOIL'
+        elif cmd == 'visc':
+            state['visc'] = not state['visc']
+            if args:
+                state['re'] = float(args[0])
+        elif cmd == 're':
+            state['re'] = float(args[0])
+        elif cmd == 'mach':
+            state['mach'] = float(args[0])
+        elif cmd == 'iter':
+            state['iter'] = int(args[0])
+        elif cmd == 'init':
+            state['prev'] = None
+        elif cmd == 'pacc':
+            if state['pacc']:
+                state['pacc'] = False
+                out("\n Polar accumulation disabled")
+            else:
+                state['menu'] = 'PACC1'
+        elif cmd == 'pdel':
+            state['npol'] = 0
+        elif cmd == 'alfa':
+            state['amode'] = True
+            out("\n\n" + solve(float(args[0])))
+        elif cmd == 'cl':
+            target = float(args[0])
+            a = zero_alpha() + target/0.11
+            out("\n\n" + solve(round(a, 3)))
+        elif cmd == 'aseq':
+            a1, a2, da = map(float, args)
+            n = int((a2 - a1)/da + 1.5)
+            state['amode'] = True
+            for i in range(n):
+                out("\n\n" + solve(a1 + i*da))
+
+out(" ===================================================\n  XFOIL Version 6.99 (fake)\n ===================================================")
+prompt()
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    time.sleep(config['command_latency'])
+    handle(line.rstrip('\n').rstrip('\r'))
+    prompt()
@@ -1,15 +1,28 @@
-import sys, os
+import sys, os, socket
 from decimal import *
-import pexpect, time, shutil, code, numpy
+import pexpect, time, shutil, filecmp, code, numpy, multiprocessing
 
 ########################################
 # Initiation block                     # 
 ########################################
-package_files = ['pyxfoil', 'sorter', 'div_sort', '__init__', 'runlog', 'plotter']
+package_files = ['pyxfoil', 'sorter', 'div_sort', '__init__', 'runlog', 'plotter', 'parallel', 'sessionpool', 'asyncxfoil', 'polarcache', 'catalog', 'polarfile', 'polarstore', 'polarmerge', 'zerocache', 'splitpolar', 'distributed', 'scheduler', 'divlog', 'fillplan', 'coverage', 'geometry']
 
 input_args = sys.argv[1:]
 homedir = os.getcwd() + '/'
 
+def copy_package(srcdir):
+    """
+    Copies the package_files that are missing from srcdir, or differ from this checkout's, into srcdir
+    Returns the names of the files copied
+    """
+    copied = []
+    for filename in package_files:
+        source, target = homedir + 'pyxfoil/' + filename + '.py', srcdir + filename + '.py'
+        if not os.path.exists(target) or not filecmp.cmp(source, target, shallow=False):
+            shutil.copyfile(source, target)
+            copied.append(filename)
+    return copied
+
 if len(input_args) == 0:
     print "No directory specified:"
     run_dir = raw_input("Enter a run directory >> " ).rstrip('/')
@@ -21,6 +34,7 @@ try:
     cwd = os.getcwd() + '/'
     runlogfile = file(cwd + 'logs/sessionlog.txt', 'a')
     print "Existing run loaded: " + run_dir
+    new_run = False
 except OSError:
     try:
         os.mkdir(run_dir)
@@ -30,29 +44,61 @@ except OSError:
         os.mkdir('mergedump')
         os.mkdir('savedpolars')
         cwd = os.getcwd() + '/'
-        for filename in package_files:
-            shutil.copyfile(homedir + 'pyxfoil/' + filename + '.py', 
-                            cwd + 'src/' + filename + '.py')
+        copy_package(cwd + 'src/')
         runlogfile = file(cwd + 'logs/sessionlog.txt', 'w')
         print "New run created: " + run_dir
+        new_run = True
 
     except OSError:
         print "Fatal error: directory " + run_dir + " not found and could not be created."
         sys.exit(0)
-finally:
-    sys.path.append(cwd)
-    from src import pyxfoil, sorter, runlog, plotter
-    sessionlog = runlog.runlog(runlogfile)
+
+if not new_run:
+    #runs created by an older genpolar lack the newer modules, or have stale copies of them
+    try:
+        updated = copy_package(cwd + 'src/')
+    except (IOError, OSError) as e:
+        print "Fatal error: could not upgrade " + run_dir + "/src from " + homedir + "pyxfoil/ (" + str(e) + ")."
+        print "Start genpolar from the pyxfoil checkout, or copy its pyxfoil/*.py into " + run_dir + "/src/ by hand."
+        sys.exit(0)
+    if updated:
+        print "Upgraded " + run_dir + "/src: " + ', '.join(updated)
+
+sys.path.append(cwd)
+from src import runlog, plotter, parallel, sessionpool, polarcache, catalog, polarstore, polarmerge, zerocache, splitpolar, distributed, scheduler, divlog, fillplan, coverage, geometry
+sessionlog = runlog.runlog(runlogfile, file(cwd + 'logs/events.jsonl', 'a'))
+xfpool = None
+adaptive_step = 2.0 #largest alfa step of adaptive sweeps
+cache = polarcache.polarcache()
+zeros = zerocache.zerocache()
+polardb = catalog.catalog(cwd + 'catalog.db', cwd + 'savedpolars')
+polardb.sync()
+if os.path.exists(cwd + 'logs/diverged_raw.txt') and not os.path.exists(cwd + 'logs/divergence.log'):
+    divlog.import_legacy(cwd + 'logs/diverged_raw.txt', cwd + 'logs/divergence.log')
+divergence = divlog.divindex(cwd + 'logs/divergence.log')
 
 ########################################
 # Function definitions                 #
 ########################################
 
+def get_pool(panels=200):
+    """
+    Returns the run's pool of warm XFOIL sessions, starting it on first use
+    Sessions are reused by every sweep() and fill() until genpolar quits
+    """
+    global xfpool
+    if xfpool is None:
+        xfpool = sessionpool.sessionpool(cwd, panels=panels, zeros=zeros)
+    return xfpool
+
 def get_existing(dir='savedpolars'):
     """
     Looks through output directory for polars already created
     Returns a list of existing polars
+    savedpolars/ is answered from the run's polar catalog
     """
+    if dir == 'savedpolars':
+        return polardb.names()
     existing_polars = dict()
     try: #check for complete polars
         os.chdir(cwd + dir)
@@ -62,7 +108,7 @@ def get_existing(dir='savedpolars'):
         pass
     return existing_polars
 
-def sweep(airfoils, res, min_alfa=4, write_file=True, plots_on=False, panels=200):
+def sweep(airfoils, res, min_alfa=4, write_file=True, plots_on=False, panels=200, batch=0, warm=False, adaptive=False):
     """
     Runs a large sweep over airfoil and re range
 
@@ -71,54 +117,89 @@ def sweep(airfoils, res, min_alfa=4, write_file=True, plots_on=False, panels=200
     @param write_file boolean indicating whether or not to create polars
     @param plots_on   boolean indicating whether or not to simulate with plots on
     @param panels     included as per original genpolar file
+    @param batch      number of points per ASEQ chunk in the linear range, 0 to step every alfa
+    @param warm       boolean indicating whether each Re starts from the previous Re's zero lift angle and BL
+    @param adaptive   boolean indicating whether alfa steps adapt to the CL slope and CLmax is refined
     """
     os.chdir(cwd)
 
     sessionlog.comment("Beginning sweep with minimum alfa of " + str(min_alfa))
-    xf = pyxfoil.session(logfile='sweep', plots=plots_on, force_zero=True)
-    xf.naca('0010')
-    xf.set_panels(panels)
+    settings = {'min_alfa': min_alfa, 'panels': panels, 'batch': batch, 'warm': warm, 'adaptive': adaptive}
+    polar_args = {'min_alfa': min_alfa, 'batch': batch, 'warm': warm}
+    if adaptive:
+        polar_args.update(adaptive=True, alfa_step=adaptive_step)
+    pool = get_pool(panels)
+    xf = pool.get(plots=plots_on, panels=panels)
     timeouts = 0
 
+    airfoils, res = list(airfoils), list(res)    
+    _print_estimate(scheduler.schedule([{'airfoil': naca, 're': re, 'polarname': parallel.polarname(naca, re)}
+                                        for naca in airfoils for re in res
+                                        if not polardb.exists(parallel.polarname(naca, re))],
+                                       scheduler.costmodel(polardb.timings())), 1)
     start_time = time.time()
     last_time = start_time
-    airfoils, res = list(airfoils), list(res)    
     for naca in airfoils:
         xf.naca(naca)
         for re in res:
             percentage = 100*round((airfoils.index(naca)*len(res)+res.index(re)+1.)/(len(airfoils)*len(res)), 5)
             polarname = "NACA" + naca + "_Re" + str(int(round(re/1000))).zfill(8) + "k.pol"
-            if polarname in get_existing():
+            if polardb.exists(polarname):
                 print "NACA " + naca + " Re " + (str(int(re/1000)) + 'k').rjust(8) + " has already been run: skipping (" + str(percentage) + "%)"
                 continue
     
             xf.set_re(re)
+            polar_start = time.time()
+            key = cache.key(xf, **polar_args)
+            if write_file and cache.fetch(key, cwd + 'savedpolars/' + polarname):
+                polardb.record(polarname, settings, 'cached')
+                print "NACA " + naca + " Re " + (str(int(re/1000)) + 'k').rjust(8) + " retrieved from polar cache (" + str(percentage) + "%)"
+                sessionlog.comment("NACA " + naca + ", re=" + str(re) + " retrieved from polar cache.")
+                sessionlog.polar(naca, re, 'cached', time.time()-polar_start)
+                continue
             try:
-                xf.generate_polar(filename=polarname, min_alfa=min_alfa, writefile=write_file)
+                state = xf.generate_polar(filename=polarname, writefile=write_file, **polar_args)
+                if write_file:
+                    cache.store(key, cwd + 'savedpolars/' + polarname)
+                    polardb.record(polarname, settings, 'complete')
                 sessionlog.comment("NACA " + naca + ", re=" + str(re) + " simulation complete.")
                 this_time = time.time()
+                polardb.record_time(naca, re, this_time-polar_start, 'complete', settings)
+                sessionlog.polar(naca, re, 'complete', this_time-polar_start, xf.telemetry(state))
                 print str(percentage) + "% complete, " + str(round(this_time-last_time, 3)) + " seconds"
                 last_time = this_time
             except pexpect.TIMEOUT:
-                xf.force_quit()
+                checkpoint = xf.checkpoint
+                pool.discard(xf)
                 print "XFOIL timed out at NACA=" + naca + " Re=" + str(re)
                 sessionlog.timeout(naca, re)
                 timeouts += 1
                 print "Attempting to restarting at current set."
-                xf = pyxfoil.session(airfoil=naca, re=re, logfile='sweep', plots=plots_on, force_zero=True)
+                xf = pool.get(plots=plots_on, panels=panels)
+                xf.naca(naca)
+                xf.set_re(re)
                 try:
-                    xf.generate_polar(filename=polarname, min_alfa=min_alfa, writefile=write_file)
+                    state = xf.generate_polar(filename=polarname, writefile=write_file, resume=checkpoint, **polar_args)
+                    if write_file:
+                        polardb.record(polarname, settings, 'recovered')
                     sessionlog.comment("NACA " + naca + ", Re=" + str(re) + " recovered on second try.")
                     this_time = time.time()
+                    polardb.record_time(naca, re, this_time-polar_start, 'recovered', settings)
+                    sessionlog.polar(naca, re, 'recovered', this_time-polar_start, xf.telemetry(state), timeouts=1, restarts=1)
                     print str(percentage) + "% complete, " + str(round(this_time-last_time, 3)) + " seconds"
                     last_time = this_time
                 except pexpect.TIMEOUT:
-                    xf.force_quit()
+                    sessionlog.polar(naca, re, 'timeout', time.time()-polar_start, xf.telemetry(xf.checkpoint or checkpoint),
+                                     timeouts=2, restarts=1)
+                    pool.discard(xf)
+                    if write_file:
+                        polardb.record(polarname, settings, 'timeout')
                     sessionlog.comment("NACA " + naca + ", Re=" + str(re) + " failed to recover on second try.  Continuing at next set.")
                     print "NACA " + naca + ", Re=" + str(re) + " failed to recover on second try.  Continuing at next set."
-                    xf = pyxfoil.session(logfile='sweep', plots=plots_on, force_zero=True, airfoil=naca)
+                    xf = pool.get(plots=plots_on, panels=panels)
+                    xf.naca(naca)
 
-    xf.quit()
+    pool.put(xf)
     total_seconds = time.time()-start_time
     average_time = round(total_seconds/(len(res)*len(airfoils)), 3)
     m, s = divmod(total_seconds, 60)
@@ -132,79 +213,313 @@ def sweep(airfoils, res, min_alfa=4, write_file=True, plots_on=False, panels=200
     sessionlog.comment(completion_time)
     sessionlog.comment(simulation_count)
     sessionlog.comment(average_time)
+    sessionlog.comment(cache.report())
+    sessionlog.comment(zeros.report())
     sessionlog.sweep_param(airfoils, res)
 
-    print timeout_count + '\n' + completion_time + '\n' + simulation_count + '\n' + average_time
+    print timeout_count + '\n' + completion_time + '\n' + simulation_count + '\n' + average_time + '\n' + cache.report() + '\n' + zeros.report()
+    heatmap()
+    os.chdir(cwd)
+
+def psweep(airfoils, res, workers=None, min_alfa=4, write_file=True, plots_on=False, panels=200, batch=0, adaptive=False, hedge=3.0):
+    """
+    Runs a large sweep over airfoil and re range on several XFOIL processes at once
+
+    @param airfoils   iterable of NACA numbers to sweep over, or a geometry.shapeset
+    @param res        iterable reynolds numbers to sweep over
+    @param workers    number of worker processes, defaults to the core count
+    @param write_file boolean indicating whether or not to create polars
+    @param plots_on   boolean indicating whether or not to simulate with plots on
+    @param panels     included as per original genpolar file
+    @param batch      number of points per ASEQ chunk in the linear range, 0 to step every alfa
+    @param adaptive   boolean indicating whether alfa steps adapt to the CL slope and CLmax is refined
+    @param hedge      rerun a polar on an idle worker once it has taken this many times its predicted time, None never to
+    """
+    os.chdir(cwd)
+
+    coordinates = airfoils.paths if isinstance(airfoils, geometry.shapeset) else None
+    airfoils, res = list(airfoils), list(res)
+    jobs = _sweep_jobs(airfoils, res, min_alfa, write_file, batch, adaptive, coordinates)
+    _print_estimate(jobs, workers or multiprocessing.cpu_count())
+
+    sessionlog.comment("Beginning parallel sweep with minimum alfa of " + str(min_alfa))
+    results = parallel.run(jobs, workers=workers, cwd=cwd, logfile='psweep', plots_on=plots_on, panels=panels,
+                           cache_dir=cache.cache_dir if write_file else None, zero_db=zeros.dbpath, hedge=hedge)
+    _log_results(results, jobs, airfoils, res, write_file,
+                 {'min_alfa': min_alfa, 'panels': panels, 'batch': batch, 'adaptive': adaptive})
     os.chdir(cwd)
 
-def fill(threshold=4.0, stepsize=0.25, write_file=True, plots_on=False, panels=200):
+def _sweep_jobs(airfoils, res, min_alfa, write_file, batch, adaptive, coordinates=None):
+    """
+    Returns the psweep/dsweep job dicts for the airfoil and Re pairs that have not already been run,
+    longest predicted first from the run's timing history
+
+    @param coordinates dict of {airfoil: coordinate file} for airfoils loaded from files, e.g. geometry.shapeset.paths;
+                       each file is also kept in the run's shapes/, for fill()
     """
-    Sifts through existing polars and reruns simulations with smaller step size
+    if coordinates:
+        _keep_shapes(coordinates)
+    existing = set(get_existing())
+    polar_args = {'min_alfa': min_alfa, 'writefile': write_file, 'batch': batch}
+    if adaptive:
+        polar_args.update(adaptive=True, alfa_step=adaptive_step)
+    jobs = []
+    for naca in airfoils:
+        for re in res:
+            polarname = parallel.polarname(naca, re)
+            if polarname in existing:
+                print "NACA " + naca + " Re " + (str(int(re/1000)) + 'k').rjust(8) + " has already been run: skipping"
+                continue
+            jobs.append({'airfoil': naca, 're': re, 'polarname': polarname,
+                         'kwargs': polar_args})
+            if coordinates:
+                jobs[-1]['coordinates'] = coordinates[naca]
+    return scheduler.schedule(jobs, scheduler.costmodel(polardb.timings()))
+
+def _keep_shapes(coordinates):
+    """Copies coordinate files into cwd/shapes/, so the run's polars can still be filled once the staging directory is gone"""
+    shapes_dir = os.path.join(cwd, 'shapes')
+    if not os.path.isdir(shapes_dir):
+        os.mkdir(shapes_dir)
+    for airfoil, path in coordinates.items():
+        target = os.path.join(shapes_dir, airfoil + '.dat')
+        if not os.path.exists(target):
+            shutil.copyfile(path, target)
+
+def _kept_shapes():
+    """Returns {airfoil: coordinate file} for the shapes kept in cwd/shapes/"""
+    shapes_dir = os.path.join(cwd, 'shapes')
+    if not os.path.isdir(shapes_dir):
+        return dict()
+    return dict((f[:-4], os.path.join(shapes_dir, f)) for f in os.listdir(shapes_dir) if f.endswith('.dat'))
+
+def _print_estimate(jobs, workers):
+    seconds = scheduler.estimate(jobs, workers)
+    m, s = divmod(seconds, 60)
+    h, m = divmod(m, 60)
+    estimate = ("Estimated time for " + str(len(jobs)) + " polars on " + str(workers) + " workers: " + str(int(h)) + " hours "
+                + str(int(m)) + " minutes " + str(round(s, 1)) + " seconds.")
+    if jobs:
+        estimate += "  Longest expected: " + jobs[0]['polarname'] + ", " + str(round(jobs[0]['predicted'], 1)) + " seconds."
+    sessionlog.comment(estimate)
+    print estimate
+
+def _log_results(results, jobs, airfoils, res, write_file, settings):
+    """
+    Logs each result of a psweep or dsweep as it arrives, then the sweep summary
+
+    @param results  iterable of result dicts from parallel._run_job
+    @param settings polar settings recorded in the polar database
+    """
+    timeouts = 0
+    hedged = 0
+    done = 0
+
+    start_time = time.time()
+    for result in results:
+        done += 1
+        hedged += result.get('hedged', False)
+        percentage = 100*round(float(done)/len(jobs), 5)
+        timeouts += result['timeouts']
+        for _ in range(result['timeouts']):
+            sessionlog.timeout(result['airfoil'], result['re'])
+        lookups, hits, zeroed, solves = result.get('zero_counts', [0, 0, 0, 0])
+        zeros.lookups += lookups
+        zeros.hits += hits
+        zeros.zeroed += zeroed
+        zeros.solves += solves
+        if 'cached' in result:
+            if result['cached']:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+                cache.stored += result['status'] == 'complete'
+        if write_file:
+            polardb.record(parallel.polarname(result['airfoil'], result['re']), settings,
+                           'timeout' if result['status'] == 'failed' else result['status'])
+        if result['status'] != 'cached':
+            polardb.record_time(result['airfoil'], result['re'], result['time'], result['status'], settings)
+        sessionlog.polar(result['airfoil'], result['re'], result['status'], result['time'], result.get('telemetry'),
+                         timeouts=result['timeouts'], restarts=result.get('restarts', 0), hedged=result.get('hedged', False),
+                         worker=result.get('worker', result['pid']))
+        if result['status'] == 'cached':
+            sessionlog.comment("NACA " + result['airfoil'] + ", re=" + str(result['re']) + " retrieved from polar cache.")
+        elif result['status'] == 'complete':
+            sessionlog.comment("NACA " + result['airfoil'] + ", re=" + str(result['re']) + " simulation complete.")
+        elif result['status'] == 'recovered':
+            sessionlog.comment("NACA " + result['airfoil'] + ", Re=" + str(result['re']) + " recovered on second try.")
+        elif 'error' in result:
+            sessionlog.comment("NACA " + result['airfoil'] + ", Re=" + str(result['re']) + " failed: " + result['error'])
+        else:
+            sessionlog.comment("NACA " + result['airfoil'] + ", Re=" + str(result['re']) + " failed to recover on second try.  Continuing at next set.")
+        print str(percentage) + "% complete, " + str(round(result['time'], 3)) + " seconds"
+
+    total_seconds = time.time()-start_time
+    average_time = round(total_seconds/max(1, len(jobs)), 3)
+    m, s = divmod(total_seconds, 60)
+    h, m = divmod(m, 60)
+
+    timeout_count = "Number of xfoil timeouts: " + str(timeouts) + ", hedged polars: " + str(hedged)
+    completion_time = "Time to complete: " + str(h) + " hours " + str(m) + " minutes " + str(round(s, 3)) + " seconds."
+    simulation_count = "Number of simulations: " + str(len(airfoils) * len(res))
+    average_time = "Average simulation length: " + str(average_time) + ' seconds.'
+    sessionlog.comment(timeout_count)
+    sessionlog.comment(completion_time)
+    sessionlog.comment(simulation_count)
+    sessionlog.comment(average_time)
+    sessionlog.comment(cache.report())
+    sessionlog.comment(zeros.report())
+    sessionlog.sweep_param(airfoils, res)
+
+    print timeout_count + '\n' + completion_time + '\n' + simulation_count + '\n' + average_time + '\n' + cache.report() + '\n' + zeros.report()
+    heatmap()
+
+def dsweep(airfoils, res, workers=2, port=0, lease=600, min_alfa=4, write_file=True, plots_on=False, panels=200, batch=0, adaptive=False, hedge=3.0):
+    """
+    Runs a sweep shared between hosts: this process coordinates, and leases jobs to
+    worker processes here and on any host running
+        PYXFOIL_TOKEN=<token> python distributed.py <this host> <port> [processes]
+    with the token printed when the sweep starts.  Polars from every worker are written to this run's savedpolars/.  A worker that
+    stops renewing its lease loses its job to the next worker that asks.
+
+    @param airfoils   iterable of NACA numbers to sweep over, or a geometry.shapeset, whose coordinates go to the workers with each job
+    @param res        iterable reynolds numbers to sweep over
+    @param workers    number of worker processes to start on this host, 0 for remote workers only
+    @param port       TCP port to coordinate on, 0 for any free port
+    @param lease      seconds a worker may hold a job without renewing its lease
+    @param write_file boolean indicating whether or not to create polars
+    @param plots_on   boolean indicating whether or not to simulate with plots on
+    @param panels     included as per original genpolar file
+    @param batch      number of points per ASEQ chunk in the linear range, 0 to step every alfa
+    @param adaptive   boolean indicating whether alfa steps adapt to the CL slope and CLmax is refined
+    @param hedge      lease a polar to a second worker once it has taken this many times its predicted time, None never to
+    """
+    os.chdir(cwd)
+
+    coordinates = airfoils.paths if isinstance(airfoils, geometry.shapeset) else None
+    airfoils, res = list(airfoils), list(res)
+    jobs = _sweep_jobs(airfoils, res, min_alfa, write_file, batch, adaptive, coordinates)
+    for job in jobs: #workers on other hosts cannot read this host's staging directory
+        if 'coordinates' in job:
+            job['shape'] = open(job.pop('coordinates'), 'r').read()
+    _print_estimate(jobs, max(1, workers))
+
+    coordinator = distributed.coordinator(jobs, os.path.join(cwd, 'savedpolars'), port=port, lease=lease, hedge=hedge)
+    coordinator.start()
+    address = (socket.gethostname(), coordinator.address[1])
+    print "Coordinating " + str(len(jobs)) + " polars on " + address[0] + ":" + str(address[1]) + ", token " + coordinator.token
+    sessionlog.comment("Beginning distributed sweep on port " + str(address[1]) + " with minimum alfa of " + str(min_alfa))
+    local = distributed.start_workers(('localhost', address[1]), workers, os.path.join(cwd, 'dworkers'), panels=panels,
+                                      plots_on=plots_on, cache_dir=cache.cache_dir if write_file else None,
+                                      zero_db=zeros.dbpath, token=coordinator.token)
+    try:
+        _log_results(coordinator.results(), jobs, airfoils, res, write_file,
+                     {'min_alfa': min_alfa, 'panels': panels, 'batch': batch, 'adaptive': adaptive})
+        for process in local:
+            process.join()
+    finally:
+        coordinator.close()
+    if coordinator.expired:
+        sessionlog.comment(str(coordinator.expired) + " leases expired and were handed out again.")
+    os.chdir(cwd)
+
+def polar(naca, re, sessions=3, min_alfa=4, plots_on=False, panels=200):
+    """
+    Runs a single polar with its alfa range split between several XFOIL sessions
+    For getting a few polars quickly; sweep() and psweep() have better throughput
+
+    @param naca       NACA number
+    @param re         reynolds number
+    @param sessions   number of XFOIL sessions sharing the polar
+    @param plots_on   boolean indicating whether or not to simulate with plots on
+    @param panels     included as per original genpolar file
+    """
+    os.chdir(cwd)
+    polarname = parallel.polarname(naca, re)
+    start_time = time.time()
+    points = splitpolar.generate_split(get_pool(panels), naca, re, polarname, sessions=sessions, min_alfa=min_alfa,
+                                       plots=plots_on, panels=panels)
+    sessionlog.polar(naca, re, 'failed' if points == None else 'complete', time.time() - start_time,
+                     points=points or 0, sessions=sessions)
+    if points == None:
+        print "NACA " + naca + ", Re=" + str(re) + " could not be zeroed."
+        return
+    polardb.record(polarname, {'min_alfa': min_alfa, 'panels': panels, 'sessions': sessions}, 'complete')
+    sessionlog.comment("NACA " + naca + ", re=" + str(re) + " simulation complete on " + str(sessions) + " sessions.")
+    print polarname + ": " + str(points) + " points in " + str(round(time.time() - start_time, 3)) + " seconds"
+    os.chdir(cwd)
+
+def fill(threshold=4.0, stepsize=0.25, write_file=True, plots_on=False, panels=200, max_gap=1.0, workers=None, limit=None):
+    """
+    Reruns only the alfa ranges missing from existing polars, at a smaller step size
+    Gaps between points, angles that did not converge and polars that stop below
+    threshold are found from the polar data and the divergence log, and the reruns
+    are run on several XFOIL processes at once, most alfa covered first, into _aug
+    files that are then merged into their polars.
     This should be run after sweep()
 
-    @param threshold  float minimum alfa value to be included in fill()
+    @param threshold  float polars stopping below this alfa are continued from their last point
     @param stepsize   float alfa step size to simulate with
     @param write_file boolean indicating whether polar is created
     @param plots_on   boolean indicating whether plots are shown
     @param panels     included as per original genpolar file
+    @param max_gap    float largest alfa spacing between points that is not a gap; polars from adaptive sweeps
+                      have no gaps narrower than adaptive_step
+    @param workers    number of worker processes, defaults to the core count
+    @param limit      run only this many of the reruns covering the most alfa, None for all
     """
     os.chdir(cwd)
     sessionlog.comment("Beginning fill with threshold " + str(threshold))
 
-    fillable = get_early_div(threshold)
-    if len(fillable) == 0:
+    divergence.update()
+    steps = dict((name, adaptive_step) for name, s in polardb.settings().items() if s.get('adaptive'))
+    jobs = fillplan.plan(cwd + 'savedpolars', divergence, threshold, stepsize, max_gap, write_file, steps, _kept_shapes())[:limit]
+    if len(jobs) == 0:
         print "Nothing to fill."
         return None
-
-    xf = pyxfoil.session(div_filename='aug.txt', logfile='fill', plots=plots_on, force_zero=True)
-    xf.naca('0010')
-    xf.set_panels(panels)
+    kinds = [job['kind'] for job in jobs]
+    plan = (str(len(jobs)) + " reruns in " + str(len(set(job['base'] for job in jobs))) + " polars covering "
+            + str(round(sum(job['coverage'] for job in jobs), 2)) + " degrees of alfa: "
+            + ', '.join(str(kinds.count(kind)) + ' ' + kind for kind in ['gap', 'diverged', 'tail']))
+    sessionlog.comment(plan)
+    print plan
+    settings = {'threshold': threshold, 'stepsize': stepsize, 'panels': panels, 'max_gap': max_gap}
     timeouts = 0
+    done = 0
 
     start_time = time.time()
-    last_time = start_time
- 
-    for early in fillable:
-        xf.naca(early['airfoil'])
-        xf.set_re(early['re'])
-        percentage = 100*(list(fillable).index(early)+1.)/len(fillable)
-        polarname = "NACA" + early['airfoil'] + "_Re" + str(int(round(early['re']/1000))).zfill(8) + "k_aug1.pol"
-        if polarname in get_existing():
-            print "NACA " + early['airfoil'] + " Re " + (str(int(early['re']/1000)) + 'k').rjust(8) + " has already been run: skipping (" + str(percentage) + "%)"
-            continue
-        try:
-            xf.generate_polar(filename=polarname, writefile=write_file, min_alfa=threshold, start_value=early['a'] + stepsize, alfa_step=stepsize)
-            sessionlog.comment("NACA " + early['airfoil'] + ", re=" + str(early['re']) + " simulation complete.")
-            this_time = time.time()
-            print str(percentage) + "% complete, " + str(round(this_time-last_time, 3)) + " seconds"
-            last_time = this_time
-        except pexpect.TIMEOUT:
-            xf.force_quit()
-            print "XFOIL timed out at NACA=" + early['airfoil'] + " Re=" + str(early['re'])
-            sessionlog.timeout(early['airfoil'], early['re'])
-            timeouts += 1
-            print "Restarting at next set."
-            xf = pyxfoil.session(div_filename='aug.txt', logfile='fill', plots=plots_on, force_zero=True)
-    
-    xf.quit()
+    for result in parallel.run(jobs, workers=workers, cwd=cwd, logfile='fill', plots_on=plots_on, panels=panels):
+        done += 1
+        percentage = 100*round(float(done)/len(jobs), 5)
+        timeouts += result['timeouts']
+        for _ in range(result['timeouts']):
+            sessionlog.timeout(result['airfoil'], result['re'])
+        if write_file:
+            polardb.record(result['polarname'], settings, 'timeout' if result['status'] == 'failed' else result['status'])
+        sessionlog.polar(result['airfoil'], result['re'], result['status'], result['time'], result.get('telemetry'),
+                         timeouts=result['timeouts'], restarts=result['restarts'], kind='fill')
+        sessionlog.comment("NACA " + result['airfoil'] + ", re=" + str(result['re']) + " " + result['polarname'] + " " + result['status'] + ".")
+        print str(percentage) + "% complete, " + str(round(result['time'], 3)) + " seconds"
+
     total_seconds = time.time()-start_time
-    average_time = round(total_seconds/len(fillable), 3)
+    average_time = round(total_seconds/len(jobs), 3)
     m, s = divmod(total_seconds, 60)
     h, m = divmod(m, 60)
         
     timeout_count = "Number of xfoil timeouts: " + str(timeouts)
     completion_time = "Time to complete: " + str(h) + " hours " + str(m) + " minutes " + str(round(s, 3)) + " seconds."
-    simulation_count = "Number of simulations: " + str(len(fillable))
+    simulation_count = "Number of simulations: " + str(len(jobs))
     average_time = "Average simulation length: " + str(average_time) + ' seconds.'
     sessionlog.comment(timeout_count)
     sessionlog.comment(completion_time)
     sessionlog.comment(simulation_count)
     sessionlog.comment(average_time)
-    sessionlog.fill_param(fillable)
+    sessionlog.fill_param(jobs)
 
     print timeout_count + '\n' + completion_time + '\n' + simulation_count + '\n' + average_time
     merge()
-    plotter.histogram(filename='histogram', threshold=threshold)
+    plotter.histogram(filename='histogram', threshold=threshold, polars=polardb.last_points())
+    heatmap()
     os.chdir(cwd)
 
 def get_early_div(threshold=5.0):
@@ -212,62 +527,57 @@ def get_early_div(threshold=5.0):
     Extracts polars which end at alfa lower than threshold
     Returns a list of dictionaries
     """
+    return polardb.early(threshold)
+
+def merge(workers=None):
+    """
+    Merges .pol files with all of their _aug.pol files
+    Dumps the original files in cwd/mergedump/
+    New merged files with more complete alfas replace old ones in cwd/savedpolars/
+
+    @param workers number of processes merging polars, defaults to the core count
+    """
+    merged = polarmerge.merge_dir(cwd + 'savedpolars', cwd + 'mergedump', workers)
+    for result in merged:
+        polardb.record(result['polar'], status='merged')
+        for aug in result['merged']:
+            polardb.remove(aug)
+    sessionlog.comment(str(len(merged)) + " files merged with their filler files.")
+    print str(len(merged)) + " files merged with their filler files."
     os.chdir(cwd)
-    earlies = list(filter(sorter.cutoff_generator(threshold), sorter.dict_to_list(sorter.dir_to_dict(cwd + 'savedpolars'))))
-    os.chdir(cwd)
-    return earlies
 
-def interleave(lst1, lst2):
+def pack():
+    """
+    Packs every polar in cwd/savedpolars/ into the columnar store cwd/polarstore/
+    Returns the store, memory-mapped for analysis
     """
-    Helper function for merge().  Merges two lists of comparable items together in increasing order.
-    Returns a the merged list of lst1 and lst2 in sorted ascending order.
+    store = polarstore.import_dir(cwd + 'savedpolars', cwd + 'polarstore')
+    sessionlog.comment(str(len(store)) + " polars packed into polarstore.")
+    print str(len(store)) + " polars (" + str(store.points().sum()) + " points) packed into " + cwd + "polarstore/"
+    return store
 
-    @param lst1, lst2 lists to merge together
+def heatmap(filename='coverage.html'):
     """
-    final = ""
-    while len(lst1) > 0 and len(lst2) > 0:
-        line1 = lst1[0]
-        line2 = lst2[0]
-        if line1[0] > line2[0]:
-            final += lst2.pop(0)
-        elif line1[0] == line2[0]:
-            final += lst1.pop(0)
-            lst2.pop(0)
-        else:
-            final += lst1.pop(0)
+    Writes (airfoil x Re) heatmaps of last alfa, CLmax, point count and XFOIL timeouts
+    of every polar in cwd/savedpolars/ to a static HTML page in cwd
 
-    if len(lst1) > 0:
-        final += ''.join(l for l in lst1)
-    if len(lst2) > 0:
-        final += ''.join(l for l in lst2)
-    return final
+    @param filename name of the HTML page
+    """
+    sessionlog.flush()
+    events = runlog.read_events(cwd + 'logs/events.jsonl') if os.path.exists(cwd + 'logs/events.jsonl') else []
+    airfoils, res, grids = coverage.from_dir(cwd + 'savedpolars', coverage.timeouts_from_events(events))
+    coverage.write_html(cwd + filename, airfoils, res, grids, 'Polar coverage of ' + run_dir)
+    print "Coverage of " + str(len(airfoils)) + " airfoils at " + str(len(res)) + " Reynolds numbers written to " + cwd + filename
 
-def merge():
+def report(slowest=10):
     """
-    Merges .pol files with _aug.pol files
-    Dumps the original files in cwd/mergedump/
-    New merged files with more complete alfas replace old ones in cwd/savedpolars/
+    Prints the run's sweep performance from logs/events.jsonl: throughput, time per
+    airfoil family and Re decade, and the slowest polars
+
+    @param slowest number of slowest polars listed
     """
-    os.chdir(cwd + 'savedpolars')
-    augfiles = [f for f in os.listdir(os.getcwd()) if 'aug' in f]
-    files_merged = 0
-    for aug in augfiles:
-        polar_header = file(aug, 'r').readlines()[:12]
-        polar_original = file(aug[:20] + '.pol', 'r').readlines()
-        polar_augment = file(aug, 'r').readlines()
-        try:
-            shutil.move(aug[:20] + '.pol', cwd + 'mergedump')
-            shutil.move(aug, cwd + 'mergedump')
-        except shutil.Error:
-            os.remove(cwd + 'mergedump/' + aug[:20] + '.pol')
-            os.remove(cwd + 'mergedump/' + aug)
-            shutil.move(aug[:20] + '.pol', cwd + 'mergedump')
-            shutil.move(aug, cwd + 'mergedump')
-        file(aug[:20] + '.pol', 'w').write(''.join(l for l in polar_header) + interleave(polar_original[12:], polar_augment[12:]))
-        files_merged += 1
-    sessionlog.comment(str(files_merged) + " files merged with their filler files.")
-    print str(files_merged) + " files merged with their filler files."
-    os.chdir(cwd)
+    sessionlog.flush()
+    print runlog.report(runlog.read_events(cwd + 'logs/events.jsonl'), slowest)
      
 ########################################
 # Runtime code                         #
@@ -293,5 +603,11 @@ while (inputline.lower() != "quit"):
 
     inputline = raw_input("Genpolar >> ")
 
+if xfpool is not None:
+    xfpool.close()
+polardb.close()
+zeros.close()
+divergence.update()
+divergence.save()
 sessionlog.close()
 os.chdir(homedir)
@@ -0,0 +1,162 @@
+"""Drive many XFOIL sessions from a single thread
+
+Session methods here are generator coroutines.  A coroutine yields the
+coroutines it calls and receives their results, much like ``await``::
+
+    def job(xf, naca, re):
+        yield xf.start()
+        yield xf.naca(naca)
+        yield xf.set_re(re)
+        out = yield xf.alfa(2.0)
+        raise Return(out.lookup('CL'))
+
+    ev = loop()
+    cls = ev.run([job(session(), '2412', re) for re in Res])
+
+:py:class:`loop` waits on every XFOIL pty at once with select, so dozens of
+XFOIL children can share one Python interpreter.  :py:class:`session` is a
+:py:class:`pyxfoil.session` whose :py:func:`pyxfoil.coroutine` methods are
+handed to the loop instead of being run with blocking reads, so it has every
+command, zero lift search and polar option of :py:class:`pyxfoil.session`.
+"""
+import os, sys, select, time, types
+import re as regexp
+import pexpect
+import pyxfoil
+from pyxfoil import command, Return
+
+class task:
+    def __init__(self, coroutine):
+        self.stack = [coroutine]
+        self.waiting = None
+        self.deadline = None
+        self.result = None
+
+    def done(self):
+        return not self.stack
+
+class loop:
+    """Runs coroutines until they finish, multiplexing the XFOIL ptys they wait on"""
+    def __init__(self):
+        self.tasks = []
+        self.buffers = dict()
+
+    def spawn(self, coroutine):
+        t = task(coroutine)
+        self.tasks.append(t)
+        self.advance(t)
+        return t
+
+    def advance(self, t, value=None, exc=None):
+        """Resume t until it waits on xfoil or finishes"""
+        while t.stack:
+            gen = t.stack[-1]
+            try:
+                if exc is not None:
+                    yielded = gen.throw(*exc)
+                    exc = None
+                else:
+                    yielded = gen.send(value)
+            except Return as r:
+                t.stack.pop()
+                value = r.value
+                continue
+            except StopIteration:
+                t.stack.pop()
+                value = None
+                continue
+            except Exception:
+                t.stack.pop()
+                exc = sys.exc_info()
+                value = None
+                continue
+            value = None
+            if isinstance(yielded, types.GeneratorType):
+                t.stack.append(yielded)
+            elif isinstance(yielded, command):
+                if yielded.cmd is not None:
+                    yielded.session.proc.sendline(yielded.cmd)
+                t.waiting = yielded
+                t.deadline = None if yielded.timeout is None else time.time() + yielded.timeout
+                self.check(t)
+                return
+            else:
+                value = yielded #already a result
+        t.waiting = None
+        #an exception nobody caught becomes the task's result
+        t.result = exc[1] if exc is not None else value
+
+    def check(self, t):
+        """Resume t if the prompt it waits for is already buffered"""
+        cmd = t.waiting
+        buf = self.buffers.get(cmd.session, '')
+        found = regexp.search(cmd.prompt, buf)
+        if found:
+            self.buffers[cmd.session] = buf[found.end():]
+            cmd.session.proc.before = buf[:found.start()]
+            t.waiting = None
+            self.advance(t, cmd.session.proc.before)
+
+    def run(self, coroutines=()):
+        """
+        Runs coroutines, and any already spawned, to completion
+
+        :returns: list of each coroutine's result, or the exception it raised
+        """
+        tasks = [self.spawn(c) for c in coroutines]
+        while True:
+            waiting = [t for t in self.tasks if t.waiting is not None]
+            if not waiting:
+                break
+            now = time.time()
+            deadlines = [t.deadline for t in waiting if t.deadline is not None]
+            wait = max(0, min(deadlines) - now) if deadlines else None
+            fds = dict((t.waiting.session.proc.child_fd, t) for t in waiting)
+            ready = select.select(fds.keys(), [], [], wait)[0]
+            for fd in ready:
+                t = fds[fd]
+                xf = t.waiting.session
+                try:
+                    data = xf.proc.read_nonblocking(65536, timeout=0)
+                except pexpect.TIMEOUT:
+                    continue
+                except pexpect.EOF:
+                    t.waiting = None
+                    self.advance(t, exc=sys.exc_info())
+                    continue
+                self.buffers[xf] = self.buffers.get(xf, '') + data
+                self.check(t)
+            now = time.time()
+            for t in waiting:
+                if t.waiting is not None and t.deadline is not None and now > t.deadline:
+                    cmd = t.waiting
+                    t.waiting = None
+                    self.buffers[cmd.session] = ''
+                    self.advance(t, exc=(pexpect.TIMEOUT, pexpect.TIMEOUT('Timeout waiting for ' + cmd.prompt), None))
+        self.tasks = [t for t in self.tasks if not t.done()]
+        return [t.result for t in tasks]
+
+class session(pyxfoil.session):
+    """A :py:class:`pyxfoil.session` whose coroutine methods run on a :py:class:`loop`
+
+    XFOIL is spawned immediately; yield :py:func:`start` before anything else.
+    Paths are resolved against run_dir, since the working directory is shared by every session in the loop.
+    """
+    autostart = False
+
+    def __init__(self, logfile=None,
+                 div_filename='divergence.log',
+                 xfoil_start_cmd='xfoil',
+                 output_dir='./savedpolars/',
+                 run_dir=None,
+                 plots=False,
+                 force_zero=False,
+                 stats=None):
+        pyxfoil.session.__init__(self, logfile, div_filename, xfoil_start_cmd, output_dir, plots=plots,
+                                 force_zero=force_zero, run_dir=run_dir or os.getcwd(), stats=stats)
+        #sendline would otherwise sleep, stalling every session in the loop
+        self.proc.delaybeforesend = None
+
+    def drive(self, coroutine):
+        """Coroutine methods are left for the loop to run"""
+        return coroutine
@@ -0,0 +1,130 @@
+import os, time, json, sqlite3
+import polarfile
+
+def parse_polar_name(polarname):
+    """
+    Returns (airfoil, re, aug) for names like NACA2412_Re00100000k.pol or NACA2412_Re00100000k_aug1.pol,
+    and for staged shapes, NACAshape-3f2a9c01d4_Re00100000k.pol
+    """
+    if not (polarname.startswith('NACA') and polarname.endswith('.pol') and '_Re' in polarname):
+        return None, None, False
+    airfoil, rest = polarname[4:].split('_Re', 1)
+    try:
+        return airfoil, int(rest[:8])*1000, '_aug' in rest
+    except ValueError:
+        return None, None, False
+
+def polar_stats(polarpath):
+    """Returns (points, min alfa, max alfa) of a polar file"""
+    alfas = polarfile.read(polarpath)[1][:, 0]
+    if not len(alfas):
+        return 0, None, None
+    return len(alfas), float(alfas.min()), float(alfas.max())
+
+class catalog():
+    """
+    SQLite index of every polar in a run: airfoil, Re, settings, point count, alfa range and status
+    It is updated as polars are written, so existence checks, fill planning and
+    reports are queries instead of directory scans.
+
+    @param dbpath   path of the database file, normally in the run directory
+    @param polardir directory holding the run's polars
+    """
+    def __init__(self, dbpath, polardir):
+        self.polardir = polardir
+        self.db = sqlite3.connect(dbpath)
+        self.db.text_factory = str #session.naca() wants str, not unicode
+        self.db.execute('''CREATE TABLE IF NOT EXISTS polars (
+                               name TEXT PRIMARY KEY,
+                               airfoil TEXT, re REAL, aug INTEGER,
+                               settings TEXT,
+                               points INTEGER, min_alfa REAL, max_alfa REAL,
+                               status TEXT, mtime REAL, updated REAL)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS polars_airfoil_re ON polars (airfoil, re)')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS timings (
+                               airfoil TEXT, re REAL, seconds REAL, status TEXT, settings TEXT, recorded REAL)''')
+        self.db.commit()
+
+    def record(self, name, settings=None, status='complete', airfoil=None, re=None):
+        """
+        Adds or updates the entry for polar file name in polardir
+
+        @param name     polar file name
+        @param settings dict of the settings the polar was run with
+        @param status   e.g. 'complete', 'recovered', 'cached', 'merged'; 'failed' if no file was written,
+                        'malformed' if its data does not parse
+        """
+        parsed_airfoil, parsed_re, aug = parse_polar_name(name)
+        path = os.path.join(self.polardir, name)
+        if os.path.exists(path):
+            try:
+                points, lo, hi = polar_stats(path)
+            except ValueError as e:
+                print "Skipping " + str(e)
+                points, lo, hi, status = 0, None, None, 'malformed'
+            mtime = os.path.getmtime(path)
+        else:
+            points, lo, hi, mtime = 0, None, None, None
+            status = 'failed'
+        if settings is None:
+            row = self.db.execute('SELECT settings FROM polars WHERE name = ?', (name,)).fetchone()
+            settings = json.loads(row[0]) if row and row[0] else None
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO polars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (name, airfoil or parsed_airfoil, re or parsed_re, int(aug),
+                             json.dumps(settings) if settings is not None else None,
+                             points, lo, hi, status, mtime, time.time()))
+
+    def record_time(self, airfoil, re, seconds, status='complete', settings=None):
+        """Adds how long XFOIL took over one polar to the run's timing history, used to schedule later sweeps"""
+        with self.db:
+            self.db.execute('INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?)',
+                            (airfoil, re, seconds, status, json.dumps(settings) if settings is not None else None,
+                             time.time()))
+
+    def timings(self):
+        """Returns a list of (airfoil, re, seconds) for every polar timed in this run"""
+        return self.db.execute('SELECT airfoil, re, seconds FROM timings').fetchall()
+
+    def settings(self):
+        """Returns {name: settings dict} for every polar recorded with its settings"""
+        rows = self.db.execute("SELECT name, settings FROM polars WHERE settings IS NOT NULL AND status != 'failed'")
+        return dict((name, json.loads(settings)) for name, settings in rows)
+
+    def remove(self, name):
+        with self.db:
+            self.db.execute('DELETE FROM polars WHERE name = ?', (name,))
+
+    def sync(self):
+        """
+        Brings the catalog up to date with polardir, reparsing only new or modified files
+        Needed once per run, for polars written by older versions or by hand.
+        """
+        known = dict(self.db.execute("SELECT name, mtime FROM polars WHERE status != 'failed'").fetchall())
+        present = [p for p in os.listdir(self.polardir) if p.endswith('.pol')]
+        for name in present:
+            if known.get(name) != os.path.getmtime(os.path.join(self.polardir, name)):
+                self.record(name, status='imported')
+        for name in set(known) - set(present):
+            self.remove(name)
+
+    def exists(self, name):
+        """True if polar file name has been written"""
+        return self.db.execute("SELECT 1 FROM polars WHERE name = ? AND status != 'failed'", (name,)).fetchone() is not None
+
+    def names(self):
+        return [row[0] for row in self.db.execute("SELECT name FROM polars WHERE status != 'failed'")]
+
+    def last_points(self):
+        """Returns a list of {'airfoil', 're', 'a'} with the highest alfa reached for each (airfoil, Re), including fill polars"""
+        rows = self.db.execute('''SELECT airfoil, re, MAX(max_alfa) FROM polars
+                                  WHERE airfoil IS NOT NULL AND max_alfa IS NOT NULL
+                                  GROUP BY airfoil, re ORDER BY airfoil, re''')
+        return [{'airfoil': airfoil, 're': int(re), 'a': a} for airfoil, re, a in rows]
+
+    def early(self, threshold):
+        """Returns last_points() entries that stopped below threshold alfa"""
+        return [p for p in self.last_points() if p['a'] < threshold]
+
+    def close(self):
+        self.db.close()
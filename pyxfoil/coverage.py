@@ -0,0 +1,121 @@
+"""
+Coverage of a run as (airfoil x Re) matrices: last alfa, CLmax, point count and timeouts,
+built in one vectorized pass over the polar data and written as a static HTML page of heatmaps
+"""
+import cgi, time
+import numpy
+import polarfile, catalog
+
+metrics = [('last_alfa', 'Last alfa (degrees)', False),
+           ('cl_max', 'CLmax', False),
+           ('points', 'Points', False),
+           ('timeouts', 'XFOIL timeouts', True)] #(key, title, lower is better)
+
+def build(names, alfa, cl, offsets, timeouts=None):
+    """
+    Returns (airfoils, res, grids) for the polars names, whose rows offsets[i]:offsets[i+1]
+    of the alfa and cl columns belong to names[i], with grids a dict of
+    (len(airfoils), len(res)) arrays for every metric; NaN where there is no polar.
+    Filler (_aug) polars count towards their base polar.
+
+    @param timeouts dict of {(airfoil, re): number of timeouts}, e.g. from the run's events
+    """
+    parsed = [catalog.parse_polar_name(name) for name in names]
+    keep = numpy.array([airfoil != None for airfoil, re, aug in parsed], dtype=bool)
+    airfoil_names = numpy.array([airfoil for airfoil, re, aug in parsed], dtype=object)[keep]
+    re_values = numpy.array([re or 0 for airfoil, re, aug in parsed], dtype=float)[keep]
+    airfoils, rows = numpy.unique(airfoil_names.astype(str), return_inverse=True)
+    res, cols = numpy.unique(re_values, return_inverse=True)
+    shape = (len(airfoils), len(res))
+
+    #reduce over every polar's rows before dropping unparsed names, so none of their rows join another polar
+    counts = numpy.diff(offsets)
+    filled = counts > 0
+    last_alfa = numpy.full(len(counts), -numpy.inf)
+    cl_max = numpy.full(len(counts), -numpy.inf)
+    if filled.any():
+        starts = numpy.asarray(offsets[:-1])[filled]
+        last_alfa[filled] = numpy.maximum.reduceat(alfa[:offsets[-1]], starts)
+        cl_max[filled] = numpy.maximum.reduceat(cl[:offsets[-1]], starts)
+    counts, last_alfa, cl_max = counts[keep], last_alfa[keep], cl_max[keep]
+
+    grids = dict()
+    present = numpy.zeros(shape, dtype=bool)
+    present[rows, cols] = True
+    for key, values in [('last_alfa', last_alfa), ('cl_max', cl_max)]:
+        grid = numpy.full(shape, -numpy.inf)
+        numpy.maximum.at(grid, (rows, cols), values)
+        grid[~numpy.isfinite(grid)] = numpy.nan
+        grids[key] = grid
+    points = numpy.zeros(shape)
+    numpy.add.at(points, (rows, cols), counts)
+    grids['points'] = numpy.where(present, points, numpy.nan)
+    grid = numpy.where(present, 0., numpy.nan)
+    for (airfoil, re), n in (timeouts or {}).items():
+        i, j = numpy.searchsorted(airfoils, airfoil), numpy.searchsorted(res, re)
+        if i < len(airfoils) and j < len(res) and airfoils[i] == airfoil and res[j] == re:
+            grid[i, j] = n
+    grids['timeouts'] = grid
+    return list(airfoils), list(res), grids
+
+def from_dir(polardir, timeouts=None):
+    names, headers, data, offsets = polarfile.read_dir(polardir)
+    return build(names, data[:, 0], data[:, 1], offsets, timeouts)
+
+def from_store(store, timeouts=None):
+    """From a polarstore.polarstore, without reading any polar files"""
+    return build(store.names, store.column('alpha'), store.column('CL'), store.offsets, timeouts)
+
+def timeouts_from_events(events):
+    """Sums the timeouts of runlog polar events by (airfoil, re)"""
+    timeouts = dict()
+    for event in events:
+        key = (str(event['airfoil']), round(float(event['re']), -3)) #to the thousand, as in the polar's name
+        timeouts[key] = timeouts.get(key, 0) + event.get('timeouts', 0)
+    return timeouts
+
+_stops = numpy.array([[215, 48, 39], [254, 224, 139], [26, 152, 80]], dtype=float) #red, yellow, green
+
+def colors(grid, reverse=False):
+    """Returns an array of '#rrggbb' strings shading grid from red (low) to green (high), grey for NaN"""
+    finite = numpy.isfinite(grid)
+    lo, hi = (grid[finite].min(), grid[finite].max()) if finite.any() else (0., 1.)
+    t = numpy.where(finite, (grid - lo)/(hi - lo if hi > lo else 1.), 0.)
+    if reverse:
+        t = 1 - t
+    scaled = 2*t
+    lower = numpy.minimum(scaled.astype(int), 1)
+    frac = (scaled - lower)[..., None]
+    rgb = (_stops[lower]*(1 - frac) + _stops[lower + 1]*frac).astype(int)
+    hexes = numpy.array(['#%02x%02x%02x' % tuple(c) for c in rgb.reshape(-1, 3)], dtype=object).reshape(grid.shape)
+    hexes[~finite] = '#dddddd'
+    return hexes
+
+def _re_label(re):
+    return str(int(re/1000)) + 'k'
+
+def html(airfoils, res, grids, title='Polar coverage'):
+    """Returns a static HTML page with one heatmap table per metric"""
+    s = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>' + cgi.escape(title) + '</title>\n',
+         '<style>body{font-family:sans-serif;font-size:12px} table{border-collapse:collapse;margin-bottom:2em} '
+         'td,th{padding:2px 4px;text-align:right;border:1px solid #fff} th{background:#f4f4f4}</style></head><body>\n',
+         '<h1>' + cgi.escape(title) + '</h1>\n<p>' + str(len(airfoils)) + ' airfoils, ' + str(len(res)) + ' Reynolds numbers, '
+         + str(int(numpy.isfinite(grids['points']).sum())) + ' polars. Written ' + time.strftime('%Y-%m-%d %H:%M') + '.</p>\n']
+    header = '<tr><th>Airfoil \\ Re</th>' + ''.join('<th>' + _re_label(re) + '</th>' for re in res) + '</tr>\n'
+    for key, name, reverse in metrics:
+        grid = grids[key]
+        shades = colors(grid, reverse)
+        s.append('<h2>' + name + '</h2>\n<table>\n' + header)
+        for i, airfoil in enumerate(airfoils):
+            cells = []
+            for j in range(len(res)):
+                value = '' if numpy.isnan(grid[i, j]) else ('%g' % round(grid[i, j], 3))
+                cells.append('<td style="background:' + shades[i, j] + '" title="NACA ' + airfoil + ' Re ' + _re_label(res[j])
+                             + '">' + value + '</td>')
+            s.append('<tr><th>' + airfoil + '</th>' + ''.join(cells) + '</tr>\n')
+        s.append('</table>\n')
+    s.append('</body></html>\n')
+    return ''.join(s)
+
+def write_html(path, airfoils, res, grids, title='Polar coverage'):
+    open(path, 'w').write(html(airfoils, res, grids, title))
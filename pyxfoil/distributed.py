@@ -0,0 +1,322 @@
+"""
+Sweeps shared between hosts: a coordinator leases (airfoil, Re) jobs to workers over TCP
+
+Messages are one JSON object per line, one request per connection, each with the
+coordinator's shared 'token'; requests without it are refused:
+    {'op': 'claim', 'worker': name}                      -> {'job', 'lease', 'seconds'} or {'job': None, 'done'}
+    {'op': 'renew', 'lease': lease}                      -> {'ok'}
+    {'op': 'complete', 'lease', 'result', 'polar'}       -> {'ok'}
+A job for an airfoil loaded from a file carries the file's text as 'shape', which the
+worker writes to its own run directory.  Leases that are not renewed expire and their jobs go back in the queue,
+up to max_requeues times before the job is reported failed.  A job that raises on a worker is
+completed as failed with its 'error'.  Once the queue is empty, a job running far beyond its 'predicted' seconds is leased a second
+time, and the first completion wins.
+
+Start a worker on another host with
+    PYXFOIL_TOKEN=<token> python distributed.py <coordinator host> <port> [processes] [run dir]
+"""
+import os, sys, time, json, hmac, socket, binascii, tempfile, threading, collections, multiprocessing, SocketServer
+import parallel, polarcache, zerocache
+
+def _str(value):
+    """json.loads hook: XFOIL commands want str, not unicode"""
+    if isinstance(value, unicode):
+        return str(value)
+    if isinstance(value, list):
+        return [_str(v) for v in value]
+    if isinstance(value, dict):
+        return dict((_str(k), _str(v)) for k, v in value.items())
+    return value
+
+# longest request line read; a 'complete' carries a whole polar file
+_max_message = 16*2**20
+
+class _handler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(_max_message + 1)
+        try:
+            message = _str(json.loads(line)) if len(line) <= _max_message else None
+        except ValueError:
+            message = None
+        coordinator = self.server.coordinator
+        if not isinstance(message, dict):
+            reply = {'error': 'bad message'}
+        elif not hmac.compare_digest(str(message.get('token', '')), coordinator.token):
+            reply = {'error': 'bad token'}
+        elif message.get('op') == 'claim':
+            reply = coordinator.claim(message.get('worker'))
+        elif message.get('op') == 'renew':
+            reply = {'ok': coordinator.renew(message['lease'])}
+        elif message.get('op') == 'complete':
+            reply = {'ok': coordinator.complete(message['lease'], message['result'], message.get('polar'))}
+        else:
+            reply = {'error': 'unknown op ' + str(message.get('op'))}
+        self.wfile.write(json.dumps(reply) + '\n')
+
+def failed_result(job, error, seconds, worker=None):
+    """Returns the result dict of a job that failed without a result from parallel._run_job"""
+    return {'airfoil': job['airfoil'], 're': job['re'], 'polarname': job['polarname'], 'timeouts': 0, 'restarts': 0,
+            'pid': os.getpid(), 'worker': worker, 'status': 'failed', 'error': error, 'time': seconds}
+
+class _server(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class coordinator():
+    """
+    Holds the jobs of a distributed sweep and hands them out under leases
+
+    A worker must renew its lease before it expires or the job is queued again
+    for another worker.  The first completion of a job wins; its polar is
+    written to polardir and its result is queued for :py:func:`results`.
+
+    @param jobs     list of job dicts as for parallel.run
+    @param polardir directory completed polars are written to
+    @param port     TCP port to listen on, 0 for any free port
+    @param token    shared secret every request must carry, a new random one if None
+    @param lease    seconds a lease lasts without renewal
+    @param hedge    lease a job again once it has run this many times its 'predicted' seconds, None never to
+    @param hedge_after seconds a job must have run before it is leased again
+    @param max_requeues times a job is queued again after its lease expires before it is given up as failed
+    """
+    def __init__(self, jobs, polardir, host='', port=0, lease=600., hedge=None, hedge_after=30., token=None, max_requeues=3):
+        self.jobs = list(jobs)
+        self.token = token or binascii.hexlify(os.urandom(16))
+        self.polardir = polardir
+        self.lease = lease
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.max_requeues = max_requeues
+        self.requeues = collections.Counter() #job index -> times queued again
+        self.started = dict() #job index -> time first leased
+        self.hedged = set()
+        self.pending = collections.deque(range(len(self.jobs)))
+        self.leases = dict() #lease -> (job index, expiry, worker)
+        self.done = set()
+        self.expired = 0
+        self.issued = 0
+        self.completed = collections.deque()
+        self.lock = threading.Lock()
+        self.server = _server((host, port), _handler)
+        self.server.coordinator = self
+        self.address = self.server.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expire(self):
+        """Queues the jobs of expired leases again, or fails those queued max_requeues times already"""
+        now = time.time()
+        with self.lock:
+            for lease, (index, expiry, worker) in self.leases.items():
+                if expiry < now:
+                    del self.leases[lease]
+                    if index in self.done or index in [i for i, e, w in self.leases.values()]:
+                        continue #completed, or still running under a hedged lease
+                    print "Lease on " + self.jobs[index]['polarname'] + " held by " + str(worker) + " expired"
+                    self.expired += 1
+                    if self.requeues[index] < self.max_requeues:
+                        self.requeues[index] += 1
+                        self.pending.append(index)
+                        continue
+                    print "Giving up on " + self.jobs[index]['polarname'] + " after " + str(self.requeues[index] + 1) + " expired leases"
+                    self.done.add(index)
+                    result = failed_result(self.jobs[index], str(self.requeues[index] + 1) + ' leases expired',
+                                           now - self.started[index], worker)
+                    result['hedged'] = index in self.hedged
+                    result['predicted'] = self.jobs[index].get('predicted')
+                    self.completed.append(result)
+
+    def claim(self, worker):
+        self.expire()
+        with self.lock:
+            while self.pending and self.pending[0] in self.done:
+                self.pending.popleft()
+            if self.pending:
+                index = self.pending.popleft()
+            else:
+                index = self.straggler()
+                if index == None:
+                    return {'job': None, 'done': len(self.done) == len(self.jobs)}
+                self.hedged.add(index)
+                print "Hedging " + self.jobs[index]['polarname'] + " on " + str(worker)
+            self.started.setdefault(index, time.time())
+            self.issued += 1
+            lease = str(index) + ':' + str(self.issued)
+            self.leases[lease] = (index, time.time() + self.lease, worker)
+            return {'job': self.jobs[index], 'lease': lease, 'seconds': self.lease}
+
+    def straggler(self):
+        """Returns the index of the leased job furthest past its hedging time, or None"""
+        if not self.hedge:
+            return None
+        now = time.time()
+        overdue = [(now - self.started[index], index) for index, expiry, worker in self.leases.values()
+                   if index not in self.done and index not in self.hedged
+                   and now - self.started[index] > max(self.hedge_after, self.hedge*self.jobs[index].get('predicted', self.hedge_after))]
+        return max(overdue)[1] if overdue else None
+
+    def renew(self, lease):
+        with self.lock:
+            if lease not in self.leases:
+                return False
+            index, expiry, worker = self.leases[lease]
+            self.leases[lease] = (index, time.time() + self.lease, worker)
+            return True
+
+    def complete(self, lease, result, polar):
+        index = int(lease.split(':')[0])
+        with self.lock:
+            self.leases.pop(lease, None)
+            if index in self.done:
+                return False #a duplicate after an expired lease
+            self.done.add(index)
+        result['hedged'] = index in self.hedged
+        result['predicted'] = self.jobs[index].get('predicted')
+        if polar != None:
+            path = os.path.join(self.polardir, self.jobs[index]['polarname'])
+            fd, tmp = tempfile.mkstemp(dir=self.polardir, suffix='.tmp')
+            os.write(fd, polar)
+            os.close(fd)
+            os.rename(tmp, path)
+        self.completed.append(result)
+        return True
+
+    def results(self, poll=1.):
+        """Yields the result of each job as it completes, until every job is done"""
+        yielded = 0
+        while yielded < len(self.jobs):
+            if self.completed:
+                yielded += 1
+                yield self.completed.popleft()
+            else:
+                self.expire()
+                time.sleep(poll)
+
+class TokenError(Exception):
+    """The coordinator refused a request's token"""
+    pass
+
+def request(address, message, token, timeout=60):
+    """Sends message with token to the coordinator at address and returns its reply"""
+    sock = socket.create_connection(tuple(address), timeout)
+    try:
+        sock.sendall(json.dumps(dict(message, token=token)) + '\n')
+        reply = _str(json.loads(sock.makefile('r').readline()))
+    finally:
+        sock.close()
+    if reply.get('error') == 'bad token':
+        raise TokenError('Coordinator at ' + str(address) + ' refused the token; set PYXFOIL_TOKEN to the one it printed')
+    return reply
+
+def _retry(address, message, token, retries):
+    """
+    Sends message, retrying with growing waits while the coordinator is unreachable
+    Returns the reply, or None if it was unreachable retries + 1 times in a row
+    """
+    for failures in range(1, retries + 2):
+        try:
+            return request(address, message, token)
+        except socket.error:
+            if failures <= retries:
+                time.sleep(2**failures)
+    return None
+
+def _renew(address, lease, token, seconds, stop):
+    while not stop.wait(seconds/3.):
+        try:
+            if not request(address, {'op': 'renew', 'lease': lease}, token)['ok']:
+                return
+        except (socket.error, TokenError):
+            pass
+
+def work(address, run_dir=None, name=None, panels=200, plots_on=False, cache_dir=None, zero_db=None, retries=5, token=None):
+    """
+    Claims and runs jobs from the coordinator at address until it has none left
+
+    @param address  (host, port) of the coordinator
+    @param token    the coordinator's token, from $PYXFOIL_TOKEN if None
+    @param run_dir  scratch run directory for this worker's logs and polars, a new temporary directory if None
+    @param name     worker name shown in the coordinator's messages
+    @param retries  number of times in a row the coordinator may be unreachable before giving up
+    """
+    token = token or os.environ.get('PYXFOIL_TOKEN', '')
+    run_dir = run_dir or tempfile.mkdtemp(prefix='pyxfoil_worker')
+    for d in ['logs', 'savedpolars', 'shapes']:
+        if not os.path.isdir(os.path.join(run_dir, d)):
+            os.makedirs(os.path.join(run_dir, d))
+    name = name or socket.gethostname() + ':' + str(os.getpid())
+    parallel._init_worker({'cwd': run_dir, 'logfile': 'dsweep', 'div_filename': 'divergence.log',
+                           'plots_on': plots_on, 'panels': panels, 'cache_dir': cache_dir, 'zero_db': zero_db})
+    try:
+        while True:
+            reply = _retry(address, {'op': 'claim', 'worker': name}, token, retries)
+            if reply == None:
+                print "Coordinator at " + str(address) + " unreachable, stopping " + name
+                return
+            if reply['job'] == None:
+                if reply['done']:
+                    return
+                time.sleep(2) #the remaining jobs are leased to other workers
+                continue
+            job = reply['job']
+            stop = threading.Event()
+            renewer = threading.Thread(target=_renew, args=(address, reply['lease'], token, reply['seconds'], stop))
+            renewer.daemon = True
+            renewer.start()
+            start_time = time.time()
+            try:
+                if 'shape' in job:
+                    shape_path = os.path.join(run_dir, 'shapes', job['airfoil'] + '.dat')
+                    open(shape_path, 'w').write(job.pop('shape'))
+                    job['coordinates'] = shape_path
+                result = parallel._run_job(job)
+            except Exception as e:
+                #complete the job as failed, rather than leave its lease to expire and fail the next worker too
+                print job['polarname'] + " failed on " + name + ": " + repr(e)
+                result = failed_result(job, repr(e), time.time() - start_time)
+                parallel._xf.force_quit()
+                parallel._xf = parallel._start_session()
+            finally:
+                stop.set()
+            result['worker'] = name
+            path = os.path.join(run_dir, 'savedpolars', job['polarname'])
+            polar = open(path, 'r').read() if os.path.exists(path) else None
+            if _retry(address, {'op': 'complete', 'lease': reply['lease'], 'result': result, 'polar': polar},
+                      token, retries) == None:
+                print "Coordinator at " + str(address) + " unreachable, stopping " + name + "; " + path + " was not delivered"
+                return
+            if polar != None:
+                os.remove(path)
+    except TokenError as e:
+        print str(e) + ", stopping " + name
+    finally:
+        parallel._close_session()
+
+def start_workers(address, processes, run_dir=None, **settings):
+    """Starts processes worker processes on this host, each with its own scratch run directory"""
+    workers = []
+    for i in range(processes):
+        worker_dir = os.path.join(run_dir, 'worker' + str(i)) if run_dir else None
+        process = multiprocessing.Process(target=work, args=(address, worker_dir), kwargs=settings)
+        process.daemon = True
+        process.start()
+        workers.append(process)
+    return workers
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print __doc__
+        sys.exit(1)
+    address = (sys.argv[1], int(sys.argv[2]))
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else multiprocessing.cpu_count()
+    run_dir = sys.argv[4] if len(sys.argv) > 4 else None
+    for process in start_workers(address, processes, run_dir, cache_dir=polarcache.default_dir(),
+                                 zero_db=zerocache.default_path()):
+        process.join()
@@ -1,77 +1,61 @@
 import os, sys
+import polarfile, divlog
 
 path = os.getcwd()
-polars = os.listdir(path + '/savedpolars/')
+polars = set(os.listdir(path + '/savedpolars/'))
 logpath = path + '/logs/'
 polarpath = path + '/savedpolars/'
 os.chdir(logpath)
 
 def get_last_point(filename, filepath=polarpath):
-    polar = open(filepath + filename, "r")
-    lines = polar.readlines()
-    return lines[-1].rstrip().split()[0]
+    return polarfile.last_point(filepath + filename)
 
 def polarname(naca, re):
-    return "NACA" + naca + "_Re" + str(int(float(re)/1000)).zfill(8) + "k.pol" 
-
-def clean_line(line):
-    print line.rstrip().split('//')[0]
-    return line.rstrip().split('//')[0]
-
-if len(sys.argv) == 2:
-    raw_file = open(sys.argv[1], 'r')
+    return "NACA" + naca + "_Re" + str(int(float(re)/1000)).zfill(8) + "k.pol"
+
+def line(airfoil, re, a=None):
+    record = {'airfoil': airfoil, 're': re}
+    if a != None:
+        record['a'] = a
+    return str(record)
+
+if len(sys.argv) == 2 and sys.argv[1].endswith('.txt'):
+    #an old str(dict) log: convert it once, then index the converted log
+    divlog.import_legacy(sys.argv[1], 'divergence.log')
+    index = divlog.divindex('divergence.log')
+elif len(sys.argv) == 2:
+    index = divlog.divindex(sys.argv[1])
 else:
-    raw_file = open("diverged_raw.txt", 'r')
-
-raws = [clean_line(l) for l in raw_file.readlines() if (len(clean_line(l))>0 and '+' not in l)]
-print "number of points: " + str(len(raws))
-print raws[0]
+    index = divlog.divindex('divergence.log')
+index.save()
 
 failed_zeros = ['// airfoil, re pairs where xfoil failed to converge by cl and step zero']
 div_processed = ['\n// last points where xfoil converged']
 div_early = []
-processed = dict()
-
-for line in raws:
-    if line.startswith('@') or line.startswith('&'):
-        #fail to zero
-        literal = eval(line[1:])
-        if polarname(naca=literal['airfoil'], re=literal['re']) not in polars:
-            failed_zeros.append(line[1:])
-    elif 'a' not in eval(line):
-        failed_zeros.append(line)
-    else:
-        literal = eval(line)
-        literal['a'] = round(literal['a'], 3)
-        pair = (literal['airfoil'], literal['re'])
-        if pair in processed:
-            if processed[pair] < literal['a']:
-                processed[pair] = literal['a']
-        else:
-            processed[pair] = literal['a']
 
-for key in sorted(processed.keys()):
-    if processed[key] < 5: #a < 5
-        file_name = key[0] + '_Re' + str(int(round(key[1]/1000))).zfill(8)
-        try:
-            last = get_last_point(file_name + 'k.pol')
-            if type(last) is float and last < 5:
-                try:
-                    aug_last = get_last_point(filename=file_name + 'k_aug1.pol')
-                    if type(aug_last) is float and aug_last < 5:
-                        div_early.append('{' + "'airfoil': '" + str(key[0]) + "', 're': " + str(key[1]) + ", 'a': " + str(processed[key]) + '}')
-                except IOError:
-                    div_early.append('{' + "'airfoil': '" + str(key[0]) + "', 're': " + str(key[1]) + ", 'a': " + str(processed[key]) + '}')
-        except IOError:
-            print "file " + file_name + " does not exist"
-            div_early.append('{' + "'airfoil': '" + str(key[0]) + "', 're': " + str(key[1]) + ", 'a': " + str(processed[key]) + '}')
-    div_processed.append('{' + "'airfoil': '" + str(key[0]) + "', 're': " + str(key[1]) + ", 'a': " + str(processed[key]) + '}')
+for airfoil, re in index.failed_zeros():
+    if polarname(airfoil, re) not in polars:
+        failed_zeros.append(line(airfoil, re))
+
+for (airfoil, re), entry in sorted(index.entries.items()):
+    last = entry['last_converged']
+    if last == None:
+        #logs imported from diverged_raw.txt have no 'end' records; go by the highest diverged angle, as div_sort always did
+        last = entry['last_diverged']
+    if last == None:
+        continue
+    if last < 5:
+        file_name = 'NACA' + airfoil + '_Re' + str(int(round(re/1000))).zfill(8)
+        ends = [get_last_point(name) for name in [file_name + 'k.pol', file_name + 'k_aug1.pol'] if name in polars]
+        if not [a for a in ends if a != None and a >= 5]:
+            div_early.append(line(airfoil, re, last))
+    div_processed.append(line(airfoil, re, last))
 
 file("failed_zeros.txt", "w").write('\n'.join(failed_zeros))
 file("diverged.txt", "w").write('\n'.join(failed_zeros))
 file("diverged.txt", "a").write('\n'.join(div_processed))
 file("early_diverged.txt", "w").write('\n'.join(div_early))
-print str(len(raws)).rjust(6) + " points sorted (including duplicates)"
-print str(len(failed_zeros)).rjust(6) + " unique points written to failed_zeros.txt"
+print str(len(index.entries)).rjust(6) + " airfoil, Re pairs indexed"
+print str(len(failed_zeros) - 1).rjust(6) + " unique points written to failed_zeros.txt"
 print str(len(div_early)).rjust(6) + " unique points written to early_diverged.txt"
-print str(len(div_processed)).rjust(6) + " total unique points of non-convergence"
+print str(len(div_processed) - 1).rjust(6) + " total unique points of non-convergence"
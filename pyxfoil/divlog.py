@@ -0,0 +1,161 @@
+"""
+Divergence log of a run and an index of it keyed on (airfoil, Re)
+
+Sessions append one tab separated record per event to logs/divergence.log:
+    <kind>  <airfoil>  <re>  <alfa, or - for none>
+with kind one of
+    diverged     a point did not converge
+    unrecorded   a point converged but was not written to the polar
+    zero_failed  CL could not be zeroed
+    step_failed  CL could not be zeroed, even by stepping back from a = 0
+    end          a polar stopped; alfa is the last angle that converged
+"""
+import os, ast, json, bisect, tempfile
+
+kinds = ('diverged', 'unrecorded', 'zero_failed', 'step_failed', 'end')
+legacy_prefixes = {'': 'diverged', '+': 'unrecorded', '@': 'zero_failed', '&': 'step_failed'} #of diverged_raw.txt lines
+
+def format_record(kind, airfoil, re, a=None):
+    return kind + '\t' + str(airfoil) + '\t' + repr(float(re)) + '\t' + ('-' if a == None else repr(round(a, 3))) + '\n'
+
+def parse_record(line):
+    """Returns (kind, airfoil, re, alfa or None) of a log line"""
+    kind, airfoil, re, a = line.rstrip('\n').split('\t')
+    return kind, airfoil, float(re), None if a == '-' else float(a)
+
+def read(path):
+    """Yields every record of a divergence log"""
+    for line in open(path):
+        if line.strip():
+            yield parse_record(line)
+
+def import_legacy(rawpath, logpath):
+    """Appends the records of an old str(dict) diverged_raw.txt to logpath; returns the number of records"""
+    count = 0
+    with open(logpath, 'a') as log:
+        for line in open(rawpath):
+            line = line.split('//')[0].strip()
+            if not line:
+                continue
+            prefix = line[0] if line[0] in '+@&' else ''
+            record = ast.literal_eval(line[len(prefix):])
+            kind = legacy_prefixes[prefix]
+            if kind == 'diverged' and 'a' not in record:
+                kind = 'zero_failed' #old sessions logged a failed zero lift without a prefix too
+            log.write(format_record(kind, record['airfoil'], record['re'], record.get('a')))
+            count += 1
+    return count
+
+def key(airfoil, re):
+    """Index key of airfoil at re: session airfoil names are NACA2412, the rest of a run uses 2412"""
+    airfoil = str(airfoil)
+    if airfoil.startswith('NACA'):
+        airfoil = airfoil[4:]
+    return airfoil, float(re)
+
+class divindex():
+    """
+    Per (airfoil, Re) summary of a divergence log, brought up to date incrementally
+
+    :py:func:`update` parses only the records appended since the last update, and the
+    index is saved next to the log with the offset it has read up to, so opening it
+    again does not reparse the log.  Queries are dict lookups.
+
+    @param logpath path of the divergence log
+    """
+    def __init__(self, logpath):
+        self.logpath = logpath
+        self.indexpath = logpath + '.idx'
+        self.offset = 0
+        self.entries = dict()
+        if os.path.exists(self.indexpath):
+            saved = json.load(open(self.indexpath))
+            if os.path.exists(logpath) and saved['offset'] <= os.path.getsize(logpath):
+                self.offset = saved['offset']
+                self.entries = dict(((str(airfoil), re), entry) for airfoil, re, entry in saved['entries'])
+        self.update()
+
+    def add(self, kind, airfoil, re, a=None):
+        k = key(airfoil, re)
+        entry = self.entries.get(k)
+        if entry == None:
+            entry = self.entries[k] = {'diverged': 0, 'angles': [], 'first_diverged': None, 'last_diverged': None,
+                                       'last_converged': None, 'failed_zero': False}
+        if kind in ('diverged', 'unrecorded'):
+            entry['diverged'] += 1
+            i = bisect.bisect_left(entry['angles'], a)
+            if i == len(entry['angles']) or entry['angles'][i] != a:
+                entry['angles'].insert(i, a)
+            if kind == 'unrecorded':
+                return #converged, so not a bound on where the polar diverged
+            if entry['first_diverged'] == None or a < entry['first_diverged']:
+                entry['first_diverged'] = a
+            if entry['last_diverged'] == None or a > entry['last_diverged']:
+                entry['last_diverged'] = a
+        elif kind in ('zero_failed', 'step_failed'):
+            entry['failed_zero'] = entry['last_converged'] == None
+        elif kind == 'end':
+            entry['failed_zero'] = False
+            if entry['last_converged'] == None or a > entry['last_converged']:
+                entry['last_converged'] = a
+
+    def update(self):
+        """Indexes the records appended to the log since the last update; returns how many there were"""
+        if not os.path.exists(self.logpath):
+            return 0
+        with open(self.logpath, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind('\n') + 1 #a record still being written is left for the next update
+        count = 0
+        for line in data[:end].splitlines():
+            if line.strip():
+                self.add(*parse_record(line))
+                count += 1
+        self.offset += end
+        return count
+
+    def save(self):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.indexpath)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'offset': self.offset,
+                       'entries': [[airfoil, re, entry] for (airfoil, re), entry in self.entries.items()]}, f)
+        os.rename(tmp, self.indexpath)
+
+    def entry(self, airfoil, re):
+        return self.entries.get(key(airfoil, re))
+
+    def last_converged(self, airfoil, re):
+        """Last angle that converged in the polars of airfoil at re, or None"""
+        entry = self.entry(airfoil, re)
+        return entry['last_converged'] if entry else None
+
+    def last_diverged(self, airfoil, re):
+        """Highest angle that did not converge for airfoil at re, or None"""
+        entry = self.entry(airfoil, re)
+        return entry['last_diverged'] if entry else None
+
+    def diverged_angles(self, airfoil, re):
+        """Sorted angles that did not make it into the polars of airfoil at re"""
+        entry = self.entry(airfoil, re)
+        return entry['angles'] if entry else []
+
+    def failed_zero(self, airfoil, re):
+        """True if CL could not be zeroed for airfoil at re and no polar has been run since"""
+        entry = self.entry(airfoil, re)
+        return bool(entry and entry['failed_zero'])
+
+    def early(self, airfoil, re, threshold=5.0):
+        """True if the polars of airfoil at re stopped below threshold alfa"""
+        last = self.last_converged(airfoil, re)
+        return last != None and last < threshold
+
+    def failed_zeros(self):
+        """Returns (airfoil, re) pairs whose CL could not be zeroed"""
+        return sorted(k for k, entry in self.entries.items() if entry['failed_zero'])
+
+    def early_list(self, threshold=5.0):
+        """Returns {'airfoil', 're', 'a'} for every (airfoil, Re) whose polars stopped below threshold alfa"""
+        return [{'airfoil': airfoil, 're': re, 'a': entry['last_converged']}
+                for (airfoil, re), entry in sorted(self.entries.items())
+                if entry['last_converged'] != None and entry['last_converged'] < threshold]
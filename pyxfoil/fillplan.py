@@ -0,0 +1,96 @@
+import numpy
+import polarfile, polarmerge, catalog
+
+def polar_gaps(alfas, diverged=(), threshold=4.0, stepsize=.25, max_gap=1.0):
+    """
+    Finds the alfa ranges one polar is missing
+    Returns a list of (first alfa, last alfa or None, kind, degrees covered) with kind
+        'gap'      consecutive points further apart than max_gap
+        'diverged' a point between two converged points that did not converge
+        'tail'     the polar stopped below threshold; last alfa is None, to step on to stall
+    Overlapping ranges are merged.
+
+    @param alfas    sorted alfas of the polar's points
+    @param diverged angles that did not make it into the polar, from the divergence log
+    @param stepsize alfa step the ranges are rerun at; the points bounding a gap are not rerun
+    """
+    alfas = numpy.asarray(alfas)
+    if not len(alfas):
+        return []
+    ranges = []
+    steps = numpy.diff(alfas)
+    for i in numpy.nonzero(steps > max_gap)[0]:
+        ranges.append([alfas[i] + stepsize, alfas[i + 1] - stepsize, 'gap', steps[i]])
+    diverged = numpy.asarray([a for a in diverged if alfas[0] < a < alfas[-1]])
+    if len(diverged):
+        above = numpy.searchsorted(alfas, diverged)
+        for a, lo, hi in zip(diverged, alfas[above - 1], alfas[above]):
+            if hi - lo > 2*stepsize and hi - lo <= max_gap: #else rerunning at stepsize would only retry a
+                ranges.append([lo + stepsize, hi - stepsize, 'diverged', hi - lo])
+    if alfas[-1] < threshold:
+        ranges.append([alfas[-1] + stepsize, None, 'tail', threshold - alfas[-1]])
+    ranges.sort(key=lambda r: r[0])
+    merged = []
+    for r in ranges:
+        if merged and merged[-1][1] != None and r[0] <= merged[-1][1] + stepsize/2.:
+            last = merged[-1]
+            last[1] = None if r[1] == None else max(last[1], r[1])
+            if r[1] == None:
+                last[2] = 'tail'
+            last[3] += r[3]
+        else:
+            merged.append(r)
+    return [tuple(r) for r in merged]
+
+def _aug_name(base, taken):
+    """The next filler file name for base polar name, not in taken"""
+    n = 1
+    while base[:-4] + '_aug' + str(n) + '.pol' in taken:
+        n += 1
+    name = base[:-4] + '_aug' + str(n) + '.pol'
+    taken.add(name)
+    return name
+
+def plan(polardir, divergence=None, threshold=4.0, stepsize=.25, max_gap=1.0, writefile=True, steps=None, coordinates=None):
+    """
+    Plans the reruns that close the gaps of every polar in polardir, including its unmerged filler files
+    Returns parallel.run job dicts, most alfa covered first, each with its 'kind' and 'coverage' in degrees.
+    Each job writes a new _aug filler file, for merge() to fold into its polar.
+
+    @param divergence divlog.divindex of the run, for the angles that did not converge; None to use the polars alone
+    @param threshold  polars that stop below this alfa are continued from their last point
+    @param stepsize   alfa step of the reruns
+    @param max_gap    largest alfa spacing between points that is not a gap
+    @param steps      dict of {polar name: alfa step it was run at}; no gap of a polar is narrower than its step,
+                      so the deliberate steps of adaptive sweeps are not rerun
+    @param coordinates dict of {airfoil: coordinate file} for airfoils that are not NACA codes, e.g. staged shapes;
+                      polars of other such airfoils are not planned, as XFOIL could not load them
+    """
+    names, headers, data, offsets = polarfile.read_dir(polardir)
+    groups = dict() #base polar name -> row indices of it and its filler files
+    for i, name in enumerate(names):
+        match = polarmerge._aug_pattern.match(name)
+        base = match.group(1) + '.pol' if match else name
+        groups.setdefault(base, []).append(i)
+    taken = set(names)
+    jobs = []
+    for base, indices in sorted(groups.items()):
+        airfoil, re, aug = catalog.parse_polar_name(base)
+        if airfoil == None:
+            continue
+        coordinate_file = (coordinates or {}).get(airfoil)
+        if not airfoil.isdigit() and coordinate_file == None:
+            print "No coordinates for " + airfoil + ": " + base + " not filled"
+            continue
+        alfas = numpy.unique(numpy.concatenate([data[offsets[i]:offsets[i + 1], 0] for i in indices]))
+        diverged = divergence.diverged_angles(airfoil, re) if divergence != None else ()
+        gap = max(max_gap, (steps or {}).get(base, 0))
+        for first, last, kind, coverage in polar_gaps(alfas, diverged, threshold, stepsize, gap):
+            kwargs = {'start_value': round(first, 3), 'max_alfa': None if last == None else round(last, 3) + stepsize/2.,
+                      'alfa_step': stepsize, 'min_alfa': threshold, 'writefile': writefile}
+            jobs.append({'airfoil': airfoil, 're': re, 'polarname': _aug_name(base, taken), 'base': base,
+                         'kind': kind, 'coverage': float(coverage), 'kwargs': kwargs})
+            if coordinate_file:
+                jobs[-1]['coordinates'] = coordinate_file
+    jobs.sort(key=lambda job: -job['coverage'])
+    return jobs
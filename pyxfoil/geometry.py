@@ -0,0 +1,184 @@
+"""
+Airfoil coordinates for whole parameter grids at once, staged as XFOIL coordinate files
+
+Every generator takes parameter arrays of one shape (k,) and returns a (k, 2n - 1, 2) array of
+coordinates in XFOIL's order, from the trailing edge over the upper surface to the leading edge
+and back along the lower surface, on a cosine spaced chord of n points.
+:py:func:`stage` drops duplicate shapes and writes the rest to a tmpfs directory for session.load().
+"""
+import os, json, hashlib, tempfile
+import numpy
+
+def grid(**params):
+    """
+    Returns the full factorial of the given parameter values as a dict of flat arrays,
+    e.g. grid(m=[0, .02], p=[.4], t=numpy.arange(.08, .2, .01))
+    """
+    keys = sorted(params)
+    mesh = numpy.meshgrid(*[numpy.atleast_1d(numpy.asarray(params[k], dtype=float)) for k in keys], indexing='ij')
+    return dict((k, a.ravel()) for k, a in zip(keys, mesh))
+
+def chord(n=100):
+    """n cosine spaced x/c stations from the leading edge to the trailing edge"""
+    return 0.5*(1 - numpy.cos(numpy.linspace(0., numpy.pi, n)))
+
+def thickness(t, x, closed_te=True):
+    """NACA 4-digit half thickness at x for thickness ratios t, shape (len(t), len(x))"""
+    t = numpy.asarray(t, dtype=float)[:, None]
+    a4 = -0.1036 if closed_te else -0.1015
+    return 5*t*(0.2969*numpy.sqrt(x) - 0.1260*x - 0.3516*x**2 + 0.2843*x**3 + a4*x**4)
+
+def surfaces(xc, yc, dyc, yt):
+    """
+    Coordinates of the airfoils with camber lines yc, camber slopes dyc and half thicknesses yt at stations xc,
+    each (k, n), with the thickness laid off normal to the camber line
+    """
+    theta = numpy.arctan(dyc)
+    upper = numpy.stack([xc - yt*numpy.sin(theta), yc + yt*numpy.cos(theta)], axis=-1)
+    lower = numpy.stack([xc + yt*numpy.sin(theta), yc - yt*numpy.cos(theta)], axis=-1)
+    return numpy.concatenate([upper[:, ::-1], lower[:, 1:]], axis=1)
+
+def naca4(m, p, t, n=100, closed_te=True):
+    """
+    NACA 4-digit airfoils; the parameters need not be whole digits
+
+    @param m maximum camber as a fraction of chord (0.02 for NACA 2412)
+    @param p position of maximum camber as a fraction of chord (0.4 for NACA 2412); ignored where m is 0
+    @param t thickness ratio (0.12 for NACA 2412)
+    """
+    m, p, t = numpy.broadcast_arrays(*[numpy.atleast_1d(numpy.asarray(a, dtype=float)) for a in (m, p, t)])
+    x = chord(n)
+    mm, pp = m[:, None], numpy.where(m > 0, p, 0.5)[:, None]
+    front = x < pp
+    yc = numpy.where(front, mm/pp**2*(2*pp*x - x**2), mm/(1 - pp)**2*(1 - 2*pp + 2*pp*x - x**2))
+    dyc = numpy.where(front, 2*mm/pp**2*(pp - x), 2*mm/(1 - pp)**2*(pp - x))
+    xc = numpy.broadcast_to(x, yc.shape)
+    return surfaces(xc, yc, dyc, thickness(t, x, closed_te))
+
+#standard (non-reflexed) 5-digit mean lines 210 to 250: position of maximum camber, r and k1 at design CL 0.3
+_naca5_p = numpy.array([0.05, 0.10, 0.15, 0.20, 0.25])
+_naca5_r = numpy.array([0.0580, 0.1260, 0.2025, 0.2900, 0.3910])
+_naca5_k1 = numpy.array([361.400, 51.640, 15.957, 6.643, 3.230])
+
+def naca5(cl, p, t, n=100, closed_te=True):
+    """
+    NACA 5-digit airfoils with the standard mean line; r and k1 are interpolated between the tabulated
+    mean lines, so the position of maximum camber need not be one of them
+
+    @param cl design lift coefficient (0.3 for NACA 23012)
+    @param p  position of maximum camber as a fraction of chord, 0.05 to 0.25 (0.15 for NACA 23012)
+    @param t  thickness ratio (0.12 for NACA 23012)
+    """
+    cl, p, t = numpy.broadcast_arrays(*[numpy.atleast_1d(numpy.asarray(a, dtype=float)) for a in (cl, p, t)])
+    if ((p < _naca5_p[0]) | (p > _naca5_p[-1])).any():
+        raise ValueError('naca5: position of maximum camber must be between 0.05 and 0.25')
+    x = chord(n)
+    r = numpy.interp(p, _naca5_p, _naca5_r)[:, None]
+    k1 = (numpy.interp(p, _naca5_p, _naca5_k1)*cl/0.3)[:, None]
+    front = x < r
+    yc = numpy.where(front, k1/6*(x**3 - 3*r*x**2 + r**2*(3 - r)*x), k1*r**3/6*(1 - x))
+    dyc = numpy.where(front, k1/6*(3*x**2 - 6*r*x + r**2*(3 - r)), -k1*r**3/6)
+    xc = numpy.broadcast_to(x, yc.shape)
+    return surfaces(xc, yc, dyc, thickness(t, x, closed_te))
+
+def bernstein(order, x):
+    """Bernstein polynomials of the given order at x, shape (order + 1, len(x))"""
+    i = numpy.arange(order + 1)[:, None]
+    binomial = numpy.array([1.]*(order + 1))
+    for k in range(1, order + 1):
+        binomial[k] = binomial[k - 1]*(order - k + 1)/k
+    return binomial[:, None]*x**i*(1 - x)**(order - i)
+
+def cst(upper, lower, n=100, te=0., n1=0.5, n2=1.0):
+    """
+    Kulfan CST airfoils: the class function x**n1*(1 - x)**n2 times a Bernstein polynomial shape function
+
+    @param upper (k, order + 1) upper surface weights
+    @param lower (k, order + 1) lower surface weights, negative below the chord line
+    @param te    trailing edge thickness as a fraction of chord
+    """
+    upper, lower = numpy.atleast_2d(upper).astype(float), numpy.atleast_2d(lower).astype(float)
+    upper, lower = numpy.broadcast_arrays(upper, lower)
+    x = chord(n)
+    B = bernstein(upper.shape[1] - 1, x)
+    C = x**n1*(1 - x)**n2
+    te = numpy.broadcast_to(numpy.asarray(te, dtype=float), (upper.shape[0],))[:, None]
+    yu = C*numpy.dot(upper, B) + x*te/2
+    yl = C*numpy.dot(lower, B) - x*te/2
+    xs = numpy.broadcast_to(x, yu.shape)
+    return numpy.concatenate([numpy.stack([xs, yu], axis=-1)[:, ::-1], numpy.stack([xs, yl], axis=-1)[:, 1:]], axis=1)
+
+def unique(coords, decimals=6):
+    """
+    Returns (index, inverse) such that coords[index] are the distinct shapes, first occurrences in order,
+    and coords[index][inverse] are all of them; shapes equal to decimals places are the same shape
+    """
+    rows = numpy.ascontiguousarray(numpy.round(coords, decimals).reshape(len(coords), -1)) + 0. #+ 0. folds -0. into 0.
+    keys = rows.view(numpy.dtype((numpy.void, rows.dtype.itemsize*rows.shape[1]))).ravel()
+    first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)[1:]
+    order = numpy.argsort(first)
+    rank = numpy.empty_like(order)
+    rank[order] = numpy.arange(len(order))
+    return first[order], rank[inverse]
+
+def staging_dir():
+    """A new directory in tmpfs (/dev/shm) where there is one, else in the system temp directory"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return tempfile.mkdtemp(prefix='pyxfoil-', dir='/dev/shm')
+    return tempfile.mkdtemp(prefix='pyxfoil-')
+
+class shapeset():
+    """
+    Airfoil coordinate files staged by :py:func:`stage`
+    Iterating gives the airfoil names, so a shapeset can be passed to psweep() in place of NACA codes.
+
+    @param directory where the files are, with manifest.json
+    """
+    def __init__(self, directory, names, params, coords):
+        self.directory = directory
+        self.names = names
+        self.params = params
+        self.coords = coords
+        self.paths = dict((name, os.path.join(directory, name + '.dat')) for name in names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self, xf, name):
+        """Loads the shape called name into session xf"""
+        xf.load(name + '.dat', self.directory + '/')
+
+    def remove(self):
+        for path in self.paths.values():
+            os.remove(path)
+        os.remove(os.path.join(self.directory, 'manifest.json'))
+        os.rmdir(self.directory)
+
+def stage(coords, params=None, prefix='shape-', directory=None, decimals=6):
+    """
+    Writes each distinct shape of coords to <directory>/<name>.dat, named by prefix and
+    a hash of its rounded coordinates, and returns the :py:class:`shapeset`.
+    Every shape's parameters go to manifest.json, keyed on its name.
+
+    @param coords    (k, points, 2) array from one of the generators
+    @param params    dict of (k,) parameter arrays, e.g. from grid(); kept with the first occurrence of each shape
+    @param directory defaults to a new :py:func:`staging_dir`
+    """
+    directory = directory or staging_dir()
+    index, inverse = unique(coords, decimals)
+    shapes = numpy.round(coords[index], decimals) + 0.
+    fmt = '%.' + str(decimals) + 'f %.' + str(decimals) + 'f\n'
+    body = (fmt*shapes.shape[1])
+    names = []
+    for shape in shapes:
+        text = body % tuple(shape.ravel())
+        name = prefix + hashlib.sha1(text).hexdigest()[:10]
+        open(os.path.join(directory, name + '.dat'), 'w').write(name + '\n' + text)
+        names.append(name)
+    kept = dict((k, numpy.asarray(v)[index]) for k, v in (params or {}).items())
+    manifest = dict((name, dict((k, float(v[i])) for k, v in kept.items())) for i, name in enumerate(names))
+    json.dump(manifest, open(os.path.join(directory, 'manifest.json'), 'w'), indent=1, sort_keys=True)
+    return shapeset(directory, names, kept, shapes)
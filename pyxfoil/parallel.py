@@ -0,0 +1,234 @@
+import os, time, signal, collections, multiprocessing
+from multiprocessing.util import Finalize
+import pexpect
+import pyxfoil, polarcache, zerocache
+
+# Each pool worker owns exactly one XFOIL child, held in these globals.
+_xf = None
+_settings = None
+_cache = None
+_zeros = None
+
+def polarname(naca, re, suffix=''):
+    return "NACA" + naca + "_Re" + str(int(round(re/1000))).zfill(8) + "k" + suffix + ".pol"
+
+def _start_session(airfoil=None):
+    """
+    Spawns this worker's XFOIL session from the run directory
+    Each worker gets its own XFOIL log, tagged with the worker pid
+    """
+    os.chdir(_settings['cwd'])
+    xf = pyxfoil.session(logfile=_settings['logfile'] + str(os.getpid()),
+                         div_filename=_settings['div_filename'],
+                         plots=_settings['plots_on'],
+                         force_zero=True)
+    xf.zeros = _zeros
+    xf.naca(airfoil or '0010')
+    xf.set_panels(_settings['panels'])
+    return xf
+
+def _restart_session(airfoil=None):
+    """
+    Respawns this worker's XFOIL, or returns None if it will not start,
+    in which case the job fails and the worker tries again on its next job
+    """
+    try:
+        return _start_session(airfoil)
+    except (pexpect.ExceptionPexpect, OSError) as e:
+        print "XFOIL did not restart: " + str(e) + " (worker " + str(os.getpid()) + ")"
+        return None
+
+def _close_session():
+    if _xf is not None:
+        try:
+            _xf.quit()
+        except (pexpect.ExceptionPexpect, OSError):
+            _xf.force_quit()
+
+def _terminated(signum, frame):
+    """
+    Closes this worker's XFOIL before the worker dies to pool.terminate(),
+    which skips the exit handlers that would otherwise close it
+    """
+    if _xf is not None:
+        try:
+            _xf.force_quit()
+        except (pexpect.ExceptionPexpect, OSError):
+            pass
+    os._exit(1)
+
+def _init_worker(settings):
+    global _xf, _settings, _cache, _zeros
+    _settings = settings
+    if settings['cache_dir']:
+        _cache = polarcache.polarcache(settings['cache_dir'])
+    if settings['zero_db']:
+        _zeros = zerocache.zerocache(settings['zero_db'])
+    _xf = _start_session()
+    Finalize(None, _close_session, exitpriority=10)
+    signal.signal(signal.SIGTERM, _terminated)
+
+def _run_job(job):
+    """
+    Runs a single generate_polar job inside a worker
+    A timed-out or exited XFOIL is restarted and the job resumed from its checkpoint once;
+    a second timeout or exit abandons the job and leaves a fresh session for the next one.
+    A job that raises XfoilError, or whose XFOIL will not restart, fails with its 'error' set.
+
+    @param job dict with 'airfoil', 're', 'polarname' and the 'kwargs' for generate_polar, and
+               'coordinates', the path of the airfoil's coordinate file, for airfoils that are not NACA codes
+    Returns a dict describing the outcome, to be logged by the parent
+    """
+    global _xf
+    result = {'airfoil': job['airfoil'], 're': job['re'], 'polarname': job['polarname'], 'timeouts': 0, 'restarts': 0,
+              'pid': os.getpid()}
+    start_time = time.time()
+    if _zeros:
+        zero_counts = [_zeros.lookups, _zeros.hits, _zeros.zeroed, _zeros.solves]
+    checkpoint = None
+    if _xf is None: #the last job's XFOIL did not restart
+        _xf = _restart_session()
+    for attempt in range(2):
+        if _xf is None:
+            result['status'] = 'failed'
+            result['error'] = 'XFOIL did not restart'
+            break
+        try:
+            if job.get('coordinates'):
+                _xf.load(os.path.basename(job['coordinates']), os.path.dirname(job['coordinates']) + '/')
+            else:
+                _xf.naca(job['airfoil'])
+            _xf.set_panels(_settings['panels'])
+            _xf.set_re(job['re'])
+            polarpath = os.path.join(_xf.output_dir, job['polarname'])
+            if _cache and attempt == 0:
+                key = _cache.key(_xf, **job['kwargs'])
+                result['cached'] = _cache.fetch(key, polarpath)
+                if result['cached']:
+                    result['status'] = 'cached'
+                    break
+            result['restarts'] = attempt
+            state = _xf.generate_polar(filename=job['polarname'], resume=checkpoint, **job['kwargs'])
+            result['telemetry'] = _xf.telemetry(state)
+            if _cache and attempt == 0:
+                #a recovered polar is missing the angle that hung, so only complete polars are shared
+                _cache.store(key, polarpath)
+            result['status'] = 'complete' if attempt == 0 else 'recovered'
+            break
+        except pexpect.ExceptionPexpect as e:
+            checkpoint = _xf.checkpoint or checkpoint
+            result['telemetry'] = _xf.telemetry(checkpoint)
+            _xf.force_quit()
+            if isinstance(e, pexpect.TIMEOUT):
+                result['timeouts'] += 1
+                print "XFOIL timed out at NACA=" + job['airfoil'] + " Re=" + str(job['re']) + " (worker " + str(os.getpid()) + ")"
+            else: #EOF, XFOIL crashed or exited
+                print "XFOIL exited at NACA=" + job['airfoil'] + " Re=" + str(job['re']) + " (worker " + str(os.getpid()) + ")"
+            _xf = _restart_session(None if job.get('coordinates') else job['airfoil'])
+        except pyxfoil.XfoilError as e:
+            #e.g. coordinates that do not load; this job fails, the worker carries on with the next
+            result['status'] = 'failed'
+            result['error'] = str(e)
+            print "NACA=" + job['airfoil'] + " Re=" + str(job['re']) + " failed: " + str(e) + " (worker " + str(os.getpid()) + ")"
+            break
+    else:
+        result['status'] = 'failed'
+    if _zeros:
+        result['zero_counts'] = [b - a for a, b in zip(zero_counts, [_zeros.lookups, _zeros.hits, _zeros.zeroed, _zeros.solves])]
+    result['time'] = time.time() - start_time
+    return result
+
+def _hedged(pool, jobs, workers, polardir, hedge, hedge_after, poll=0.2):
+    """
+    Runs jobs on pool, launching a duplicate of any job running hedge times longer than its
+    'predicted' seconds (and at least hedge_after seconds) once a worker is idle
+    Every attempt writes its polar under its own name; the first to finish is renamed to
+    the job's polarname and the other's polar is discarded when it finishes.
+    Yields one result dict per job, in order of completion; a hedged job's result has 'hedged' set.
+    """
+    pending = collections.deque(range(len(jobs)))
+    running = [] #(index, attempt, AsyncResult, start time)
+    attempts = [0]*len(jobs)
+    done = set()
+
+    def submit(index):
+        attempt = attempts[index]
+        attempts[index] += 1
+        job = dict(jobs[index], polarname=jobs[index]['polarname'] + '.try' + str(attempt))
+        running.append((index, attempt, pool.apply_async(_run_job, (job,)), time.time()))
+
+    while len(done) < len(jobs):
+        while pending and len(running) < workers:
+            submit(pending.popleft())
+        if not pending and len(running) < workers:
+            now = time.time()
+            stragglers = [(now - started, index) for index, attempt, outcome, started in running
+                          if index not in done and attempts[index] == 1
+                          and now - started > max(hedge_after, hedge*jobs[index].get('predicted', hedge_after))]
+            if stragglers:
+                elapsed, index = max(stragglers)
+                print "Hedging " + jobs[index]['polarname'] + " after " + str(round(elapsed, 1)) + " seconds"
+                submit(index)
+        for entry in [entry for entry in running if entry[2].ready()]:
+            running.remove(entry)
+            index, attempt, outcome, started = entry
+            result = outcome.get()
+            attempt_path = os.path.join(polardir, jobs[index]['polarname'] + '.try' + str(attempt))
+            if index in done:
+                if os.path.exists(attempt_path):
+                    os.remove(attempt_path)
+                continue
+            done.add(index)
+            if os.path.exists(attempt_path):
+                os.rename(attempt_path, os.path.join(polardir, jobs[index]['polarname']))
+            result['polarname'] = jobs[index]['polarname'] #not the attempt's
+            result['hedged'] = attempts[index] > 1
+            result['predicted'] = jobs[index].get('predicted')
+            yield result
+        time.sleep(poll)
+    if running:
+        pool.terminate() #only losing attempts are left; their workers close their XFOILs as they go
+        for index, attempt, outcome, started in running:
+            attempt_path = os.path.join(polardir, jobs[index]['polarname'] + '.try' + str(attempt))
+            if os.path.exists(attempt_path):
+                os.remove(attempt_path)
+
+def run(jobs, workers=None, cwd=None, logfile='psweep', div_filename='divergence.log', plots_on=False, panels=200, cache_dir=None, zero_db=None,
+        hedge=None, hedge_after=30.):
+    """
+    Farms generate_polar jobs out to a pool of worker processes
+    Each worker owns one XFOIL child, so a hung XFOIL only stalls its own worker.
+    Yields one result dict per job, in order of completion.
+
+    @param jobs         iterable of job dicts (see _run_job)
+    @param workers      number of worker processes, defaults to the core count
+    @param cwd          run directory containing logs/ and savedpolars/
+    @param logfile      prefix for the per-worker XFOIL logs
+    @param div_filename divergence log shared by all workers
+    @param plots_on     boolean indicating whether or not to simulate with plots on
+    @param panels       number of airfoil panels
+    @param cache_dir    polar cache to fetch from and store to, None to always run XFOIL
+    @param zero_db      zerocache database seeding zero lift angles, None to zero without estimates
+    @param hedge        duplicate a job on an idle worker once it has run this many times its 'predicted'
+                        seconds, taking whichever attempt finishes first; None never to hedge
+    @param hedge_after  seconds a job must have run before it is hedged
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    settings = {'cwd': cwd or os.getcwd(), 'logfile': logfile, 'div_filename': div_filename,
+                'plots_on': plots_on, 'panels': panels, 'cache_dir': cache_dir,
+                'zero_db': zero_db}
+    pool = multiprocessing.Pool(workers, _init_worker, (settings,))
+    try:
+        if hedge:
+            results = _hedged(pool, list(jobs), workers, os.path.join(settings['cwd'], 'savedpolars'), hedge, hedge_after)
+        else:
+            results = pool.imap_unordered(_run_job, jobs)
+        for result in results:
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
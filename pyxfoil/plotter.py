@@ -1,34 +1,40 @@
 import os, sys
+import polarfile
 
 cwd = os.getcwd() + '/'
 
 def get_polar_info(filename):
-    os.chdir(cwd)
-    polarcontents = file(cwd + 'savedpolars/' + filename, 'r').readlines()
-    naca = polarcontents[3].rstrip()[-4:]
-    re = eval(polarcontents[8][24:43].strip().replace(' ', ''))
-    lastalfa = polarcontents[-1].lstrip().split()[0]
+    header = polarfile.read_header(cwd + 'savedpolars/' + filename)
+    return header['airfoil'], header['re'], polarfile.last_point(cwd + 'savedpolars/' + filename)
 
-    os.chdir(cwd)
-    if '---' not in lastalfa:
-        return naca, re, eval(lastalfa)
-    return naca, re, None
+def histogram(filename='divplot', threshold=5.0, polars=None):
+    """
+    Writes a text bar chart of the last alfa reached by each polar
 
-def histogram(filename='divplot', threshold=5.0):
+    @param polars list of {'airfoil', 're', 'a'}, e.g. from the run catalog; read from savedpolars/ if None
+    """
     os.chdir(cwd)
     plotfile = file(filename + '.txt', 'w')
-    printables = [f for f in os.listdir(cwd + 'savedpolars/') if f.endswith('.pol')]
     plotfile.write('Threshold at ' + str(threshold))
 
     plotdict = dict()
-    for filename in printables:
-        n, r, a = get_polar_info(filename)
+    if polars is None:
+        printables = [f for f in os.listdir(cwd + 'savedpolars/') if f.endswith('.pol')]
+        polars = []
+        for filename in printables:
+            n, r, a = get_polar_info(filename)
+            polars.append({'airfoil': n, 're': r, 'a': a})
+    for polar in polars:
+        n, r, a = polar['airfoil'], polar['re'], polar['a']
         
         if n not in plotdict:
             plotdict[n] = dict()
         plotdict[n][r] = a
 
-    maxdigits = len(str(max(map(int, plotdict[plotdict.keys()[0]].keys()))))
+    if not plotdict:
+        plotfile.close()
+        return
+    maxdigits = max(len(str(int(re))) for naca in plotdict for re in plotdict[naca])
 
     for naca in sorted(plotdict.keys()):
         plotfile.write('\n\n ' + '#'*15 + ' Airfoil: ' + naca + ' ' + '#'*15)
@@ -0,0 +1,121 @@
+import os, shutil, hashlib, inspect, tempfile
+import pyxfoil
+
+# generate_polar arguments that do not change the polar produced
+_not_in_key = ['self', 'filename', 'writefile', 'resume']
+
+def default_dir():
+    return os.environ.get('PYXFOIL_CACHE', os.path.expanduser('~/.pyxfoil/cache'))
+
+class polarcache():
+    """
+    Polar files shared between runs, keyed on a hash of the airfoil geometry
+    and every solver setting that affects the polar.
+    The least recently used polars are evicted once the cache outgrows max_bytes.
+    Only complete polars should be stored; recovered ones are missing the angle that hung.
+
+    The size of the cache is scanned once and then tracked as polars are stored, so a store does
+    not list the whole cache.  Other runs sharing the cache are only seen by a rescan, which
+    happens when the tracked size passes max_bytes or every rescan_every stores.  Eviction goes down to
+    nine tenths of max_bytes, so a full cache is not rescanned on every store.
+
+    @param cache_dir    directory holding the cache, defaults to $PYXFOIL_CACHE or ~/.pyxfoil/cache
+    @param max_bytes    size limit of the cache
+    @param rescan_every stores between rescans of the cache's size
+    """
+    def __init__(self, cache_dir=None, max_bytes=500*2**20, rescan_every=200):
+        self.cache_dir = cache_dir or default_dir()
+        self.max_bytes = max_bytes
+        self.rescan_every = rescan_every
+        self.size = None #bytes in the cache as of the last scan, plus those stored since
+        self.since_scan = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, xf, **polar_args):
+        """
+        Returns the cache key for the polar xf.generate_polar(**polar_args) would produce
+
+        @param xf         session with the airfoil and Re of the polar already set
+        @param polar_args arguments for generate_polar; unspecified ones take generate_polar's defaults
+        """
+        if xf.geometry == None:
+            raise pyxfoil.XfoilError('No airfoil loaded; cannot key a polar')
+        spec = inspect.getargspec(pyxfoil.session.generate_polar.__wrapped__)
+        settings = dict(zip(spec.args[-len(spec.defaults):], spec.defaults))
+        settings.update(polar_args)
+        for arg in _not_in_key:
+            settings.pop(arg, None)
+        settings.update({'geometry': xf.geometry, 're': xf.re, 'mach': xf.mach, 'ncrit': xf.ncrit,
+                         'iters': xf.iters, 'panels': xf.panels, 'force_zero': xf.force_zero})
+        for name, value in settings.items():
+            if isinstance(value, (int, long)) and not isinstance(value, bool):
+                settings[name] = float(value) #so that re=1000000 and re=1e6 share a key
+        return hashlib.sha1(repr(sorted(settings.items()))).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.pol')
+
+    def fetch(self, key, dest):
+        """
+        Copies the cached polar for key to dest
+        Returns True on a hit, False on a miss
+        """
+        try:
+            shutil.copyfile(self.path(key), dest)
+        except IOError:
+            self.misses += 1
+            return False
+        os.utime(self.path(key), None) #mark as recently used
+        self.hits += 1
+        return True
+
+    def store(self, key, src):
+        """Adds the polar file src to the cache under key, evicting down to max_bytes once the cache outgrows it"""
+        if not os.path.exists(src):
+            return
+        if self.size == None:
+            self.evict()
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(src, tmp)
+        os.rename(tmp, self.path(key)) #atomic, other runs never see partial polars
+        self.stored += 1
+        self.size += os.path.getsize(src)
+        self.since_scan += 1
+        if self.size > self.max_bytes or self.since_scan >= self.rescan_every:
+            self.evict()
+
+    def evict(self):
+        """Scans the cache and, if it is over max_bytes, removes the least recently used polars down to 0.9*max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pol'):
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue #evicted by another run
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes if total <= self.max_bytes else 0.9*self.max_bytes
+        for _, size, name in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                self.evicted += 1
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+        self.since_scan = 0
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = round(100.*self.hits/lookups, 1) if lookups else 0.0
+        return ("Polar cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses (" + str(rate) + "% hit rate), "
+                + str(self.stored) + " stored, " + str(self.evicted) + " evicted.")
@@ -0,0 +1,104 @@
+import os
+import numpy
+
+columns = ('alpha', 'CL', 'CD', 'CDp', 'Cm', 'Top_Xtr', 'Bot_Xtr')
+header_lines = 12
+row_format = '%8.3f%9.4f%10.5f%10.5f%9.4f%9.4f%9.4f\n'
+
+def parse_header(lines):
+    """
+    Parses the 12 header lines of an XFOIL polar by their fixed offsets
+    Returns {'airfoil', 'mach', 're', 'ncrit', 'ncols'}, with the airfoil named as in the
+    rest of the run: 2412 for NACA 2412, and the name in the coordinate file for loaded airfoils
+    """
+    airfoil = lines[3].split('Calculated polar for:', 1)[-1].strip()
+    if airfoil.startswith('NACA'):
+        airfoil = airfoil[4:].strip()
+    return {'airfoil': airfoil,
+            'mach': float(lines[8][7:15]),
+            're': float(lines[8][24:43].replace(' ', '')),
+            'ncrit': float(lines[8][50:]),
+            'ncols': len(lines[10].split())}
+
+def read_header(polarpath):
+    f = open(polarpath, 'r')
+    lines = [f.readline() for i in range(header_lines)]
+    f.close()
+    return parse_header(lines)
+
+def read(polarpath):
+    """
+    Reads an XFOIL polar file, parsing the data block in one pass
+    Returns (header text, array with one row per point and one column per entry of columns)
+    A last line without its newline is a row still being written, and is left out.
+
+    :raises: ValueError if a value does not parse or a row is short
+    """
+    f = open(polarpath, 'r')
+    lines = [f.readline() for i in range(header_lines)]
+    body = f.read()
+    f.close()
+    ncols = len(lines[10].split()) or len(columns)
+    if not body.endswith('\n'):
+        body = body[:body.rfind('\n') + 1]
+    values = numpy.fromstring(body, sep=' ')
+    #fromstring stops quietly at the first value it cannot parse, e.g. XFOIL's ****** on overflow;
+    #only blank lines are counted out one by one, when the values fall short of full rows
+    rows = body.count('\n')
+    if len(values) != rows*ncols:
+        rows = len([line for line in body.split('\n') if line.strip()])
+        if len(values) != rows*ncols:
+            raise ValueError(polarpath + ': malformed polar data, ' + str(len(values)) + ' values parsed from '
+                             + str(rows) + ' rows of ' + str(ncols))
+    return ''.join(lines), values.reshape(-1, ncols)[:, :len(columns)]
+
+def write(polarpath, header, data):
+    """Writes header and data rows in XFOIL's polar format"""
+    f = open(polarpath, 'w')
+    f.write(header)
+    f.write(''.join(row_format % tuple(row) for row in data))
+    f.close()
+
+def last_point(polarpath, blocksize=256):
+    """
+    Returns the alfa of the last point in a polar file, or None if it has no points
+    Only the end of the file is read.
+    """
+    f = open(polarpath, 'rb')
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(max(0, size - blocksize))
+    tail = f.read()
+    f.close()
+    lines = tail.rstrip().split('\n')
+    if size > blocksize and len(lines) < 2:
+        return last_point(polarpath, blocksize*4)
+    try:
+        return float(lines[-1].split()[0])
+    except (IndexError, ValueError):
+        return None #only the header, ending with its ------ line
+
+def read_dir(polardir, names=None):
+    """
+    Reads every .pol file in polardir, or the files in names
+    Returns (names, headers, data, offsets) with the rows of all polars stacked in data
+    and rows offsets[i]:offsets[i+1] belonging to names[i]
+    Polars whose data does not parse are skipped and left out of names.
+    """
+    if names is None:
+        names = sorted(p for p in os.listdir(polardir) if p.endswith('.pol'))
+    read_names, headers, arrays = [], [], []
+    for name in names:
+        try:
+            header, data = read(os.path.join(polardir, name))
+        except ValueError as e:
+            print "Skipping " + str(e)
+            continue
+        read_names.append(name)
+        headers.append(header)
+        arrays.append(data)
+    names = read_names
+    offsets = numpy.zeros(len(names) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(a) for a in arrays])
+    data = numpy.concatenate(arrays) if arrays else numpy.zeros((0, len(columns)))
+    return names, headers, data, offsets
@@ -0,0 +1,91 @@
+import os, re, heapq, shutil, tempfile, multiprocessing
+import numpy
+import polarfile
+
+_aug_pattern = re.compile(r'^(.+)_aug\d*\.pol$')
+
+def merge_rows(polars, tol=1e-4):
+    """
+    k-way merges the data arrays of several polars into one array sorted by alfa
+    Points whose alfas are within tol of the first point of their cluster are kept once,
+    preferring the earliest polar in polars.  Clusters start from their lowest alfa, so
+    a run of points spaced closer than tol but spanning more than it keeps several points.
+
+    @param polars list of data arrays as returned by polarfile.read, base polar first
+    """
+    streams = []
+    for rank, data in enumerate(polars):
+        data = data[numpy.argsort(data[:, 0], kind='mergesort')] #already sorted for polars from generate_polar
+        streams.append([(row[0], rank, i, row) for i, row in enumerate(data)])
+    merged = []
+    cluster_alfa, kept_rank = None, None #first alfa of the current cluster, rank of the row kept for it
+    for alfa, rank, i, row in heapq.merge(*streams):
+        if cluster_alfa is not None and alfa - cluster_alfa <= tol:
+            if rank < kept_rank:
+                merged[-1] = row
+                kept_rank = rank
+            continue
+        merged.append(row)
+        cluster_alfa, kept_rank = alfa, rank
+    return numpy.array(merged).reshape(-1, len(polarfile.columns))
+
+def merge_files(dest, sources, tol=1e-4):
+    """
+    Merges the polar files in sources into dest, using the header of the first source
+    dest is replaced atomically, so it may be one of the sources.
+    Returns the number of points written.
+    """
+    polars = [polarfile.read(src) for src in sources]
+    rows = merge_rows([data for header, data in polars], tol)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), suffix='.tmp')
+    os.close(fd)
+    polarfile.write(tmp, polars[0][0], rows)
+    os.rename(tmp, dest)
+    return len(rows)
+
+def find_augmented(polardir):
+    """Returns {base polar name: sorted list of its _aug polar names} for every polar in polardir with filler files"""
+    groups = dict()
+    for name in os.listdir(polardir):
+        match = _aug_pattern.match(name)
+        if match:
+            groups.setdefault(match.group(1) + '.pol', []).append(name)
+    for augs in groups.values():
+        augs.sort()
+    return groups
+
+def _dump(polardir, name, dumpdir):
+    if os.path.exists(os.path.join(dumpdir, name)):
+        os.remove(os.path.join(dumpdir, name))
+    shutil.copy2(os.path.join(polardir, name), dumpdir)
+
+def _merge_group(job):
+    polardir, base, augs, dumpdir, tol = job
+    sources = [name for name in [base] + augs if os.path.exists(os.path.join(polardir, name))]
+    for name in sources:
+        _dump(polardir, name, dumpdir)
+    points = merge_files(os.path.join(polardir, base), [os.path.join(polardir, name) for name in sources], tol)
+    for name in augs:
+        os.remove(os.path.join(polardir, name))
+    return {'polar': base, 'merged': augs, 'points': points}
+
+def merge_dir(polardir, dumpdir, workers=None, tol=1e-4):
+    """
+    Merges every polar in polardir with all of its _aug filler files
+    The original files are copied to dumpdir, the merged polar replaces the base polar,
+    and the filler files are removed.  Polars are merged in parallel worker processes.
+    Returns one {'polar', 'merged', 'points'} dict per merged polar.
+
+    @param workers number of worker processes, defaults to the core count
+    @param tol     alfas closer than tol are the same point
+    """
+    groups = find_augmented(polardir)
+    jobs = [(polardir, base, augs, dumpdir, tol) for base, augs in sorted(groups.items())]
+    if len(jobs) < 2 or workers == 1:
+        return map(_merge_group, jobs)
+    pool = multiprocessing.Pool(min(workers or multiprocessing.cpu_count(), len(jobs)))
+    try:
+        return pool.map(_merge_group, jobs)
+    finally:
+        pool.close()
+        pool.join()
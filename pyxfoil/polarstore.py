@@ -0,0 +1,79 @@
+import os, json, shutil
+import numpy
+import polarfile
+
+columns = polarfile.columns
+
+class polarstore():
+    """
+    All polars of a run packed into one memory-mapped NumPy array per column
+
+    The store is a directory holding <column>.npy for each entry of columns,
+    offsets.npy, and index.json with each polar's name and header.  Rows
+    offsets[i]:offsets[i+1] of every column belong to polar i, so
+    :py:func:`polar` and :py:func:`column` return views without copying.
+
+    @param storedir directory written by :py:func:`write` or :py:func:`import_dir`
+    """
+    def __init__(self, storedir):
+        self.storedir = storedir
+        index = json.load(open(os.path.join(storedir, 'index.json'), 'r'))
+        self.names = [str(n) for n in index['names']]
+        self.headers = index['headers']
+        self.lookup = dict((n, i) for i, n in enumerate(self.names))
+        self.offsets = numpy.load(os.path.join(storedir, 'offsets.npy'))
+        self.data = dict((c, numpy.load(os.path.join(storedir, c + '.npy'), mmap_mode='r')) for c in columns)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.lookup
+
+    def column(self, col):
+        """Returns col of every polar, concatenated in store order"""
+        return self.data[col]
+
+    def polar(self, name):
+        """Returns a dict of column views for polar name (a file name or an index)"""
+        i = self.lookup[name] if isinstance(name, basestring) else name
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return dict((c, self.data[c][start:end]) for c in columns)
+
+    def points(self):
+        """Returns the number of points in each polar"""
+        return numpy.diff(self.offsets)
+
+    def export(self, name, polardir):
+        """Writes polar name back out as an XFOIL polar file in polardir"""
+        polar = self.polar(name)
+        data = numpy.column_stack([polar[c] for c in columns])
+        polarfile.write(os.path.join(polardir, name), self.headers[self.lookup[name]], data)
+
+    def export_all(self, polardir):
+        for name in self.names:
+            self.export(name, polardir)
+
+def write(storedir, names, headers, data, offsets):
+    """
+    Packs polars into a store at storedir, replacing any store already there
+
+    @param data    array with the rows of every polar stacked, one column per entry of columns
+    @param offsets rows offsets[i]:offsets[i+1] of data belong to names[i], as returned by polarfile.read_dir
+    """
+    tmpdir = storedir.rstrip('/') + '.tmp'
+    if os.path.isdir(tmpdir):
+        shutil.rmtree(tmpdir)
+    os.makedirs(tmpdir)
+    for i, c in enumerate(columns):
+        numpy.save(os.path.join(tmpdir, c + '.npy'), numpy.ascontiguousarray(data[:, i]))
+    numpy.save(os.path.join(tmpdir, 'offsets.npy'), numpy.asarray(offsets, dtype=numpy.int64))
+    json.dump({'names': list(names), 'headers': list(headers)}, open(os.path.join(tmpdir, 'index.json'), 'w'))
+    if os.path.isdir(storedir):
+        shutil.rmtree(storedir)
+    os.rename(tmpdir, storedir)
+    return polarstore(storedir)
+
+def import_dir(polardir, storedir):
+    """Packs every .pol file in polardir into a store at storedir"""
+    return write(storedir, *polarfile.read_dir(polardir))
@@ -2,58 +2,181 @@ import pexpect
 import os
 import re as regexp
 import StringIO
+import hashlib
+import json
+import sys
+import time
+import bisect
+import itertools
+import functools
+import divlog
+import polarfile
 from datetime import datetime as dt
 from decimal import *
 
+_session_ids = itertools.count() #numbers the sessions of this process
+
+class Return(Exception):
+    """Raised by a session coroutine to hand its result back to the code that called it"""
+    def __init__(self, value=None):
+        self.value = value
+
+class command:
+    """Yielded by :py:func:`session.send`: send cmd to xfoil and resume with the text before resulting_prompt
+
+    :param cmd: the command, or None to only wait for the prompt
+    :param timeout: seconds to wait for the prompt; -1 uses the pexpect default
+    """
+    def __init__(self, xf, cmd, resulting_prompt='c>', timeout=-1):
+        self.session = xf
+        self.cmd = cmd
+        self.prompt = resulting_prompt
+        self.timeout = xf.proc.timeout if timeout == -1 else timeout
+
+def coroutine(method):
+    """Decorator for the session methods that talk to xfoil
+
+    The method is written as a generator.  It yields a :py:class:`command` to
+    wait for xfoil and yields the coroutine methods it calls to get their
+    results, and raises :py:class:`Return` to return a value.  Calling it
+    hands the generator to the session's :py:func:`session.drive`, which runs
+    it to completion with blocking reads in :py:class:`session`, and returns
+    it for the event loop to run in :py:class:`asyncxfoil.session`, so both
+    share one implementation of every command, zero lift search and polar.
+    """
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        return self.drive(method(self, *args, **kwargs))
+    call.__wrapped__ = method #for inspecting the method's own arguments
+    return call
+
 class session:
     """ DO NOT CHANGE ORDER """
     varlist = ['iter', 'rms', 'max', 'a', 'CL', 'Cm', 'CD', 'CDf', 'CDp']
+    autostart = True #wait for xfoil's first prompt in __init__; asyncxfoil sessions yield start() instead
 
     def __init__(self, logfile=None,
-                 div_filename='diverged_raw.txt',
+                 div_filename='divergence.log',
                  xfoil_start_cmd='xfoil', 
                  output_dir='./savedpolars/',
                  airfoil=None,
                  re=None,
                  plots=False,
-                 force_zero=False):
+                 force_zero=False,
+                 run_dir=None,
+                 stats=None):
 
+        #xfoil state as last set through this session, used to skip redundant commands
         self.airfoil= None
+        self.geometry = None
         self.re = None
-        self.iters = 20
+        self.mach = 0.0
+        self.ncrit = 9.0
+        self.iters = None
+        self.panels = None
+        self.menu = None
         self.bpacc = False
+        self.checkpoint = None
+        self.zero_alfa = None #zero lift angle of the last polar, for warm starts
+        self.zero_solves = 0
+        self.zero_method = None #how the last zero lift angle was found: 'warm', 'seeded', 'secant', 'step' or 'failed'
+        self.zeros = None #zerocache of zero lift angles found by earlier polars, shared between sessions
         self.plots = plots
         self.force_zero = force_zero
-        self.cwd = os.getcwd()
         self.logs_on = False
-
-        try: #make ./savedpolars/
-            os.chdir(output_dir)
-            self.output_dir = os.getcwd()
-        except OSError:
-            self.error("Invalid directory " + output_dir)
-
+        if stats == None:
+            stats = 'PYXFOIL_STATS' in os.environ
+        self.stats = commandstats() if stats else None
+
+        if run_dir != None:
+            #resolve paths against run_dir without changing directory, so
+            #sessions can be started from a background thread
+            self.changed_dir = False
+            self.cwd = os.path.abspath(run_dir)
+            self.output_dir = os.path.join(self.cwd, output_dir)
+            if not os.path.isdir(self.output_dir):
+                self.error("Invalid directory " + output_dir)
+        else:
+            self.changed_dir = True
+            self.cwd = os.getcwd()
+            try: #make ./savedpolars/
+                os.chdir(output_dir)
+                self.output_dir = os.getcwd()
+            except OSError:
+                self.error("Invalid directory " + output_dir)
+
+        #one stats file per session, as parallel workers share the run directory
+        self.stats_file = os.path.join(self.cwd, 'XFOILstats_' + str(os.getpid()) + '_' + str(next(_session_ids)) + '.json')
         if(logfile != None): #logging data to text file
             self.logs_on = True
             self.logdir = self.cwd + '/logs/'
             nowstr = dt.strftime(dt.now(), '%Y_%m_%d_%H%M%S')
             if(logfile != ''):
                 logfile = '_' + logfile
+            self.stats_file = self.logdir + 'XFOILstats' + nowstr + logfile + '.json'
             logfile = file(self.logdir + 'XFOILsession' + nowstr + logfile + '.txt', 'w')
             self.divfile = file(self.logdir + div_filename, 'a')
-        self.proc = pexpect.spawn(xfoil_start_cmd, logfile=logfile) 
-        self.proc.expect('c>')
+        self.proc = pexpect.spawn(xfoil_start_cmd, logfile=logfile, cwd=self.output_dir) 
+        if self.autostart:
+            self.start(airfoil, re)
+
+    def drive(self, coroutine):
+        """Run a :py:func:`coroutine` method to completion, blocking on xfoil for each command it sends
+
+        :returns: the method's result
+        """
+        value, error = None, None
+        while True:
+            try:
+                if error != None:
+                    yielded = coroutine.throw(*error)
+                    error = None
+                else:
+                    yielded = coroutine.send(value)
+            except Return as r:
+                return r.value
+            except StopIteration:
+                return None
+            if isinstance(yielded, command):
+                try:
+                    if yielded.cmd != None:
+                        self.proc.sendline(yielded.cmd)
+                    self.proc.expect(yielded.prompt, timeout=yielded.timeout)
+                    value = self.proc.before
+                except Exception:
+                    value, error = None, sys.exc_info()
+            else:
+                value = yielded #the result of a coroutine method it called, which has already run here
+
+    @coroutine
+    def start(self, airfoil=None, re=None):
+        """Wait for xfoil's first prompt, turn plots off unless they are on, and load airfoil at re, if given"""
+        yield command(self, None)
+        self.menu = self.current_menu()
 
         if not self.plots:
-            self.send("PLOP")
-            self.send("G")
+            yield self.send("PLOP", kind='plots_off')
+            yield self.send("G", kind='plots_off')
 
         if airfoil:
-            self.naca(airfoil)
+            yield self.naca(airfoil)
             if re:
-                self.set_re(re)
+                yield self.set_re(re)
 
-    def send(self, cmd, resulting_prompt='c>'):
+    def set_divfile(self, div_filename):
+        """Redirect divergence records to div_filename in the logs directory"""
+        if self.logs_on:
+            self.divfile.close()
+            self.divfile = file(self.logdir + div_filename, 'a')
+
+    def divrecord(self, kind, airfoil, re, a=None):
+        """Append a record to the divergence log, if logging is on (see :py:mod:`divlog`)"""
+        if self.logs_on:
+            self.divfile.write(divlog.format_record(kind, airfoil, re, a))
+            self.divfile.flush() #whole records, as workers share the log
+
+    @coroutine
+    def send(self, cmd, resulting_prompt='c>', timeout=-1, kind='send'):
         """Internal function used to send a command to xfoil.
 
         .. warning::
@@ -65,10 +188,36 @@ class session:
         :type cmd: str
         :param resulting_prompt: prompt we expect xfoil to display after cmd is sent
         :type resulting_prompt: str
+        :param timeout: seconds to wait for the prompt; -1 uses the pexpect default
+        :type timeout: int
+        :param kind: the session method sending cmd, which its time is counted under when stats are on
+        :type kind: str
+        :returns: xfoil's output before the prompt
         """
+        if self.stats != None:
+            start = time.time()
+        yield command(self, cmd, resulting_prompt, timeout)
+        if self.stats != None:
+            self.stats.waited(kind, time.time() - start)
+        #only a full command prompt tells us which menu we are in
+        self.menu = self.current_menu() if resulting_prompt == 'c>' else None
+        raise Return(self.proc.before)
+
+    def read_output(self):
+        """Return an :py:class:`output` for the last command, timing its parsing if stats are on"""
+        if self.stats == None:
+            return output(self.proc.before)
+        start = time.time()
+        out = output(self.proc.before)
+        out.values
+        self.stats.parsed(time.time() - start)
+        return out
 
-        self.proc.sendline(cmd)
-        self.proc.expect(resulting_prompt)
+    def known_menu(self):
+        """Return xfoil's current menu as recorded by the last :py:func:`send`, reading it from xfoil's output only when unknown"""
+        if self.menu == None:
+            self.menu = self.current_menu()
+        return self.menu
 
     def current_menu(self):
         """Return the line of text before xfoil's current prompt
@@ -78,6 +227,7 @@ class session:
         newline_ind = self.proc.before.rindex('\n') 
         return self.proc.before[newline_ind:].strip()
 
+    @coroutine
     def force_menu(self,menu):
         """Ensure xfoil is in a certain menu.
 
@@ -88,33 +238,36 @@ class session:
 
         if menu == "XFOIL":
             for _ in range(11):
-                if self.current_menu() == menu:
+                if self.known_menu() == menu:
                     break
-                self.send("")
+                yield self.send("", kind='force_menu')
         elif "OPER" in menu:
-            if 'OPER' not in self.current_menu():
-                self.force_menu("XFOIL")
-                self.send("OPER")
+            if 'OPER' not in self.known_menu():
+                yield self.force_menu("XFOIL")
+                yield self.send("OPER", kind='force_menu')
         else:
             self.error('Could not get to '+menu+' menu' + 
-                       ' Current menu: '+self.current_menu() + ';')
+                       ' Current menu: '+self.known_menu() + ';')
 
+    @coroutine
     def plots_off(self):
         if self.plots:
-            menu = self.current_menu()
+            menu = self.known_menu()
             if menu != "XFOIL":
-                self.force_menu("XFOIL")
-            self.send("PLOP")
-            self.send("G")
+                yield self.force_menu("XFOIL")
+            yield self.send("PLOP", kind='plots_off')
+            yield self.send("G", kind='plots_off')
             self.plots = False
-            self.force_menu(menu)
+            yield self.force_menu(menu)
 
+    @coroutine
     def plots_on(self):
         if not self.plots:
             self.plots = True
-            self.plots_off()
+            yield self.plots_off()
             self.plots = True
 
+    @coroutine
     def naca(self, code):
         """Load a naca airfoil
 
@@ -126,19 +279,28 @@ class session:
            The implementation requires string NACA codes as opposed to integers because python evaluates ``int(0015)`` as ``13`` due to octal conversion.
 
         :raises: :py:class:`XfoilError` if the NACA code is not implemented by XFOIL.
+
+        .. note::
+           Nothing is sent if the airfoil is already loaded.
         """
         if(type(code) != str):
             raise XfoilError('NACA code must be a string.  I got: '
                              + repr(code))
-        self.force_menu('xfoil')
-        self.send('naca ' + code, '>')
+        if(self.airfoil == 'NACA' + code):
+            return
+        yield self.force_menu('xfoil')
+        yield self.send('naca ' + code, '>', kind='naca')
         notimplemented = 'not implemented' in self.proc.before
         notimplemented |= 'Enter NACA' in self.proc.before
         if(notimplemented):
             raise XfoilError('NACA designation ' + code + 
                              ' not implemented by XFOIL.')
+        self.menu = 'XFOIL' #the '>' matched was the XFOIL c> prompt
         self.airfoil = 'NACA' + code
+        self.geometry = self.airfoil
+        self.zero_alfa = None
 
+    @coroutine
     def load(self, filename, relpath='./'):
         """Load airfoil from file
         
@@ -156,12 +318,21 @@ class session:
             raise XfoilError('load: filename should be a string')
         if(type(relpath) != str):
             raise XfoilError('load: relpath should be a string')
-        self.force_menu('xfoil')
-        self.send('load ' + relpath + filename)
+        yield self.force_menu('xfoil')
+        yield self.send('load ' + relpath + filename, kind='load')
         if('LOAD NOT COMPLETED' in self.proc.before):
             raise XfoilError(self.proc.before)
         self.airfoil = filename.split('.')[0]
-
+        #xfoil resolves relpath from its own directory, output_dir
+        try:
+            coords = open(os.path.join(self.output_dir, relpath + filename), 'rb').read()
+        except IOError as e:
+            raise XfoilError('load: ' + str(e))
+        self.geometry = hashlib.sha1(coords).hexdigest()
+        self.zero_alfa = None
+        self.panels = None #LOAD keeps the file's nodes; set_panels repanels
+
+    @coroutine
     def save(self, relpath='./', name_ext='fine'):
         """Save airfoil coordinates to file
 
@@ -176,11 +347,12 @@ class session:
         if(savefile != ''):
             savefile += '_'
         savefile += str(name_ext) + '.dat'
-        self.force_menu('xfoil')
-        self.send('save ' + savefile, '[>?]')
+        yield self.force_menu('xfoil')
+        yield self.send('save ' + savefile, '[>?]', kind='save')
         if('Overwrite?' in self.proc.before):
-            self.send('')
+            yield self.send('', kind='save')
 
+    @coroutine
     def set_re(self, re):
         """Go to viscous mode and set Reynold's Number to re
 
@@ -188,22 +360,48 @@ class session:
            re is rounded to the nearest 1000 before being sent to xfoil, since XFOIL's Re resolution when saving polar files is only 1e3.
         """
         re = round(float(re), -3)
-        self.force_menu('oper')
-        menu = self.current_menu()
+        if(re == self.re):
+            return
+        yield self.force_menu('oper')
+        menu = self.known_menu()
         if('i' in menu):
-            self.send('visc ' + str(re))
+            yield self.send('visc ' + str(re), kind='set_re')
         elif('v' in menu):
-            self.send('re ' + str(re))
+            yield self.send('re ' + str(re), kind='set_re')
         else:
             self.error('Unexpected menu: ' + menu)
         self.re = re
 
+    @coroutine
+    def set_mach(self, mach):
+        """Set the freestream Mach number"""
+        if(mach == self.mach):
+            return
+        yield self.force_menu('oper')
+        yield self.send('mach ' + str(mach), kind='set_mach')
+        self.mach = mach
+
+    @coroutine
+    def set_ncrit(self, n):
+        """Set the e^n transition criterion Ncrit (N in VPAR menu)"""
+        if(n == self.ncrit):
+            return
+        yield self.force_menu('oper')
+        yield self.send('vpar', kind='set_ncrit')
+        yield self.send('n ' + str(n), kind='set_ncrit')
+        yield self.send('', kind='set_ncrit')
+        self.ncrit = n
+
+    @coroutine
     def iter(self, n=20):
         """Set maximum number of xfoil iterations to n"""
-        self.force_menu('oper')
-        self.send('iter ' + str(n))
+        if(n == self.iters):
+            return
+        yield self.force_menu('oper')
+        yield self.send('iter ' + str(n), kind='iter')
         self.iters = n
 
+    @coroutine
     def pacc_on(self, savefile='default', dumpfile=''):
         """Turn on polar accumulation
 
@@ -223,45 +421,53 @@ class session:
             savefile = ''
         if(dumpfile == None):
             dumpfile = ''
-        self.force_menu('oper')
-        self.send('pacc', 's>') #turn on polar accumulation
-        self.send(savefile, 's>') #xfoil will print polar to this file
+        yield self.force_menu('oper')
+        yield self.send('pacc', 's>', kind='pacc_on') #turn on polar accumulation
+        yield self.send(savefile, 's>', kind='pacc_on') #xfoil will print polar to this file
         if('Old polar save file available for appending' in self.proc.before):
             print 'Polar file ' + savefile + ' exists; XFOIL will append'
-        self.send(dumpfile)   #prompt returns to default after this (c>)
+        yield self.send(dumpfile, kind='pacc_on')   #prompt returns to default after this (c>)
         self.bpacc = True
         self.polar_savefile = savefile
 
+    @coroutine
     def pacc_off(self, bdelete=False):
         """Turn off polar accumulation and delete internal xfoil polar.  The saved polar file is *not* deleted, unless bdelete=True.
         """
         if(not self.bpacc):
             self.error('PACC is already off')
-        self.force_menu('oper')
-        self.send('pacc')
+        yield self.force_menu('oper')
+        yield self.send('pacc', kind='pacc_off')
         self.bpacc = False
-        self.send('pdel 1') #delete internal polar
+        yield self.send('pdel 1', kind='pacc_off') #delete internal polar
         if(bdelete):
-            os.remove(self.polar_savefile)
+            os.remove(os.path.join(self.output_dir, self.polar_savefile))
 
+    @coroutine
     def init(self):
         """Initialize BL on next point.
     
         Useful after non-convergence or large steps in ALFA
         """
-        self.force_menu('oper')
-        self.send('init')
+        yield self.force_menu('oper')
+        yield self.send('init', kind='init')
 
+    @coroutine
     def set_panels(self, n):
-        """Set the number of airfoil panels (N in PPAR menu)"""
+        """Set the number of airfoil panels (N in PPAR menu) and repanel the current airfoil with PANE"""
         if(self.airfoil == None):
             raise XfoilError('No airfoil loaded; cannot set_panels.')
-        self.force_menu('xfoil')
-        self.send('ppar')
-        self.send('n ' + str(n))
-        self.send('')
-        self.send('')
-
+        if(n == self.panels):
+            return #NACA panels new airfoils with the current N, but LOAD does not (see load)
+        yield self.force_menu('xfoil')
+        yield self.send('ppar', kind='set_panels')
+        yield self.send('n ' + str(n), kind='set_panels')
+        yield self.send('', kind='set_panels')
+        yield self.send('', kind='set_panels')
+        yield self.send('pane', kind='set_panels')
+        self.panels = n
+
+    @coroutine
     def alfa(self, a, retry=0):
         """Run a single angle of attack and return output
 
@@ -269,11 +475,11 @@ class session:
         :type a: float
         :returns: An :py:class:`output` object
         """
-        self.force_menu('oper')
-        self.send('alfa ' + str(a))
+        yield self.force_menu('oper')
+        yield self.send('alfa ' + str(a), kind='alfa')
 
         for count in range(retry + 1):
-            out = output(self.proc.before)
+            out = self.read_output()
             if out.converged:
                 if count > 0:
                     print "a = " + str(a) + " converged after " + str(count) + " tries"
@@ -281,8 +487,9 @@ class session:
             #if "to continue iterating" in self.proc.before:
                 #self.send("!")
 
-        return out
+        raise Return(out)
 
+    @coroutine
     def cl(self, c):
         """Run a single CL value and return output
 
@@ -291,9 +498,35 @@ class session:
 
         :returns: An :py:class:`output` object
         """
-        self.force_menu('oper')
-        self.send('cl ' + str(c))
-        return output(self.proc.before)
+        yield self.force_menu('oper')
+        yield self.send('cl ' + str(c), kind='cl')
+        raise Return(self.read_output())
+
+    @coroutine
+    def aseq(self, a1, a2, da):
+        """Run a sequence of angles of attack with a single ASEQ command
+
+        :param a1: first angle of attack (degrees)
+        :type a1: float
+        :param a2: last angle of attack (degrees)
+        :type a2: float
+        :param da: angle of attack increment (degrees)
+        :type da: float
+
+        :returns: A list of :py:class:`output` objects, one per angle XFOIL ran
+        """
+        yield self.force_menu('oper')
+        npoints = int(round((a2 - a1)/da)) + 1
+        yield self.send('aseq ' + str(a1) + ' ' + str(a2) + ' ' + str(da),
+                  timeout=self.proc.timeout*max(1, npoints), kind='aseq')
+        if self.stats == None:
+            raise Return(split_outputs(self.proc.before))
+        start = time.time()
+        outs = split_outputs(self.proc.before)
+        for out in outs:
+            out.values
+        self.stats.parsed(time.time() - start)
+        raise Return(outs)
 
     def error(self, text):
         """:raises: an :py:class:`XfoilError`, with airfoil and Re info added to the error text
@@ -302,38 +535,114 @@ class session:
         errtext += '; Re = ' + str(self.re)
         raise XfoilError(errtext)
 
+    @coroutine
     def zero_cl(self, tries=10):
         """Attempt to find angle of zero lift
         """
         epsilon = 0
-        angle = self.cl(epsilon)
+        angle = yield self.cl(epsilon)
         for _ in range(tries):
             if angle.converged:
                 break
             epsilon += .01
-            angle = self.cl(epsilon)
+            angle = yield self.cl(epsilon)
             #if angle.lookup('CD') > 100:
             #    self.init()
         
         if not angle.converged:
             self.error("Could not zero CL")
-        return angle.lookup('a')
+        raise Return(angle.lookup('a'))
 
+    @coroutine
     def step_zero(self, step_size=.25, tries=20):
         angle = 0
-        self.init()
-        output = self.alfa(angle)
+        yield self.init()
+        output = yield self.alfa(angle)
+        self.zero_solves += 1
         for _ in range(tries):
             if output.converged:
                 if output.lookup('CL') < 0:
                     break
             else:
-                self.init()
+                yield self.init()
             angle -= step_size
-            output = self.alfa(angle)
+            output = yield self.alfa(angle)
+            self.zero_solves += 1
         if output.converged and output.lookup('CL') < 0:
-            return output.lookup('a')
-        return self.error("Could not zero CL")
+            raise Return(output.lookup('a'))
+        self.error("Could not zero CL")
+
+    @coroutine
+    def find_zero(self, guess=None, tol=0.005, tries=8, lift_slope=0.11):
+        """Find the angle of zero lift by secant iterations on converged ALFA solves
+
+        Once angles with CL of both signs have been solved, steps are kept
+        inside that bracket, bisecting when a secant step would leave it or a
+        solve does not converge.  The solves used are added to
+        :py:attr:`zero_solves`.
+
+        :param guess: starting angle, e.g. a cached estimate; without one, XFOIL's CL 0 is tried first
+        :param tol: largest absolute CL accepted as zero lift
+        :param tries: number of solves before giving up
+        :param lift_slope: CL per degree assumed for the first step
+        :returns: the angle
+        :raises: :py:class:`XfoilError` if no angle within tol is found
+        """
+        solves = 0
+        if guess == None:
+            out = yield self.cl(0)
+            solves += 1
+            self.zero_solves += 1
+            if out.converged:
+                raise Return(out.lookup('a'))
+            yield self.init()
+            guess = 0.
+        lo, hi = None, None #closest angles with CL < 0 and CL > 0
+        last = None #(angle, CL) of the last converged solve
+        angle = guess
+        while solves < tries:
+            out = yield self.alfa(angle)
+            solves += 1
+            self.zero_solves += 1
+            step = None
+            if out.converged:
+                cl = out.lookup('CL')
+                if abs(cl) < tol:
+                    raise Return(angle)
+                if cl < 0:
+                    lo = angle
+                else:
+                    hi = angle
+                if last != None and cl != last[1]:
+                    step = angle - cl*(angle - last[0])/(cl - last[1])
+                else:
+                    step = angle - cl/lift_slope
+                last = (angle, cl)
+            else:
+                yield self.init()
+            if lo != None and hi != None:
+                if step == None or not min(lo, hi) < step < max(lo, hi):
+                    step = (lo + hi)/2.
+            elif step == None:
+                step = (angle + last[0])/2. if last != None else angle - .5
+            angle = round(step, 3)
+        self.error("Could not zero CL")
+
+    @coroutine
+    def warm_zero(self):
+        """Find the angle of zero lift starting from the last polar's zero lift angle
+
+        The BL left converged at the end of the last warm polar is the initial
+        guess of the first solve, so at an adjacent Re this is usually within a
+        solve or two of the answer.
+
+        :returns: the angle, or None (with the BL initialized) if it could not be found
+        """
+        try:
+            raise Return((yield self.find_zero(self.zero_alfa, tries=3)))
+        except XfoilError:
+            yield self.init()
+            return
 
     def make_file(self, naca=None, reynolds=None):
         """
@@ -354,146 +663,514 @@ class session:
         Seeks and obtains polar data from output object
         Returns a string form of dictionary of form (var: value)
         """
-        data = dict()
-        for var in self.varlist:
-            data[var] = output.lookup(var)
+        return str(output.values.asdict())
 
-        return str(data)
+    @coroutine
+    def start_angle(self, warm=False):
+        """Find the angle of zero lift a polar starts from, recording a failure if it cannot be found
 
-    def generate_polar(self, alfa_step=.5, min_alfa=4, min_cl=0.4, filename='default', writefile=True, start_value=None):
+        :param warm: start from the previous polar's zero lift angle and BL (see :py:func:`warm_zero`)
+        :returns: the angle, or None
         """
-        1. set airfoil, reynolds number
-        2. obtain zero for cl
-        3. run alfas from zero to stall
-        4. write .pol
-        """
-
-        os.chdir(self.output_dir)
-        print "***\nAirfoil = " + self.airfoil + " Re = " + str(self.re)
-
-        if start_value == None:
+        angle = None
+        self.zero_solves = 0 #every solve spent on this polar's zero lift, including a failed warm start
+        if warm and self.zero_alfa != None:
+            angle = yield self.warm_zero()
+        if angle != None:
+            self.zero_method = 'warm'
+            print "CL zeroed from the previous Re: a = " + str(angle) + " (" + str(self.zero_solves) + " solves)"
+        else:
+            guess = None
+            if self.zeros != None:
+                guess = self.zeros.estimate(self.geometry, self.re)
             try:
-                #attemp to zero by calling cl with small values
-                angle = self.zero_cl()
-                print "CL successfully zeroed: a = " + str(angle)
+                angle = yield self.find_zero(guess)
+                self.zero_method = 'secant' if guess == None else 'seeded'
+                print "CL successfully zeroed: a = " + str(angle) + " (" + str(self.zero_solves) + " solves)"
             except XfoilError:
                 if self.force_zero:
                     #step angle backwards until cl goes negative
-        	    try:
-                        angle = self.step_zero(step_size=.2, tries=35)
+                    try:
+                        angle = yield self.step_zero(step_size=.2, tries=35)
+                        self.zero_method = 'step'
                     except XfoilError:
+                        self.zero_method = 'failed'
                         print "CL step-zeroing failed, recording failure and aborting."
-                        if self.logs_on:
-                            self.divfile.write('\n&' + str({'airfoil':self.airfoil, 're':self.re}))
-                        return None 
+                        self.divrecord('step_failed', self.airfoil, self.re)
+                        return
                     print "CL step-zeroed to: a = " +  str(angle) + " by stepping back from a=0"
                 else:
+                    self.zero_method = 'failed'
                     print "CL zeroing failed, recording faiure and aborting."
-                    if self.logs_on:
-                        self.divfile.write('\n@' + str({'airfoil':self.airfoil, 're':self.re}))
-                    return None
+                    self.divrecord('zero_failed', self.airfoil, self.re)
+                    return
+        self.zero_alfa = angle
+        if self.zeros != None:
+            self.zeros.record(self.geometry, self.re, angle, self.zero_solves)
+        raise Return(angle)
+
+    @coroutine
+    def generate_polar(self, alfa_step=.5, min_alfa=4, min_cl=0.4, filename='default', writefile=True, start_value=None, batch=0, batch_slope=0.8, resume=None, warm=False, adaptive=False, min_step=0.1, max_alfa=None, warmed=None):
+        """
+        1. set airfoil, reynolds number
+        2. obtain zero for cl
+        3. run alfas from zero to stall
+        4. write .pol
+
+        If batch > 1, the linear part of the polar is run with ASEQ in chunks
+        of batch points.  Batching stops once a chunk has a failed point or its
+        CL slope drops below batch_slope times the first chunk's slope, and the
+        rest of the polar is stepped one alfa at a time as usual.
+
+        Progress is kept in :py:attr:`checkpoint`.  If xfoil times out or exits, pass
+        the dead session's checkpoint as resume to a fresh session, along with
+        the same filename and settings, to carry on after the angle that hung.
+        A batch is checkpointed at its first angle, so the points it wrote to
+        the polar file before hanging are replayed into the checkpoint, and
+        the angle after the last of them is taken as the one that hung.  The
+        rest of a resumed polar is stepped one alfa at a time.
+
+        If warm is True, the search for zero lift starts from the zero lift
+        angle of the previous polar of this airfoil (see :py:func:`warm_zero`),
+        and a polar whose last solve converged leaves its BL for the next one
+        instead of initializing it.  Meant for sweeping Re upwards or
+        downwards through adjacent values with one airfoil.
+
+        If adaptive is True, alfa_step is the largest step taken and steps
+        shrink towards min_step as the CL slope drops, then CLmax is refined
+        by parabola fits (see :py:class:`adaptivestate`).  Batching is not
+        used with adaptive steps.
+
+        If max_alfa is given, the polar also stops once the next angle is above it.
+        If warmed is given, it is the (alfa, CL) points converged below
+        start_value on the way up to it, e.g. through the range below one of a
+        split polar, and stall is detected as if this polar had run through them.
+
+        :returns: the final :py:class:`polarstate`, or None if CL could not be zeroed
+        """
+
+        print "***\nAirfoil = " + self.airfoil + " Re = " + str(self.re)
+        self.checkpoint = None
+
+        running = True
+        if resume != None:
+            state = resume
+            state.divrecord = self.divrecord
+            polarpath = os.path.join(self.output_dir, filename)
+            if writefile and not adaptive and os.path.exists(polarpath):
+                try:
+                    points = polarfile.read(polarpath)[1][:, :2].tolist()
+                except ValueError as e:
+                    print "Could not replay " + filename + ": " + str(e)
+                    points = []
+                running = state.replay(points)
+                trim_polar(polarpath, state.angle + alfa_step/2.)
+            print "Resuming after a timeout or exit at a = " + str(state.angle)
+            if running:
+                #warm the BL up at the last good angle without recording it
+                if self.bpacc:
+                    yield self.pacc_off()
+                yield self.init()
+                yield self.alfa(state.last_converged)
+                #the angle that timed out counts as a failed point
+                running = state.failed()
+        elif start_value == None:
+            angle = yield self.start_angle(warm)
+            if angle == None:
+                return
         else:
             angle = start_value
+            self.zero_method, self.zero_solves = None, 0
             print "Beginning simulation at a = " + str(angle)
 
         if writefile and not self.bpacc:
-            self.pacc_on(savefile=filename)
+            yield self.pacc_on(savefile=filename)
         if not writefile and self.bpacc:
-            self.pacc_off()
-
-        cl_max_angle = 90 
-        cl_max = -100
-        cl_peaked = False
-        last_converged = angle
-        last_cl = -100
-        skips = 0
-
-        while True:
-            current_output = self.alfa(angle)
-            if current_output.converged:
-                skips = 0
-                #update cl_max_angle
-                last_converged = angle
-                last_cl = current_output.lookup('CL')
-            
-                if writefile and not current_output.point_added:
-                    if self.logs_on:
-                        self.divfile.write('\n+' + str({'airfoil':self.airfoil, 're':self.re, 'a':angle}))
-                    print "failed to record to polar: a = " + str(angle)
-                    angle += alfa_step
-                    continue
-
-                if last_cl > cl_max:
-                    cl_max = last_cl
-                    cl_max_angle = angle
-                elif (last_cl > min_cl or angle > min_alfa) and last_cl < cl_max - .05:
-                    print "aborting at cl = " + str(last_cl) + ", a = " + str(angle) + ": past peak " + str(cl_max) + ", " + str(cl_max_angle)
-                    break
-                elif (last_cl > min_cl or angle > min_alfa) and angle > 1 + cl_max_angle:
-                    print "aborting at cl = " + str(last_cl) + ", a = " + str(angle) + ": past peak " + str(cl_max) + ", " + str(cl_max_angle)
-                    break
+            yield self.pacc_off()
 
+        if resume == None:
+            if adaptive:
+                state = adaptivestate(self.airfoil, self.re, angle, alfa_step, min_alfa, min_cl, writefile, self.divrecord, min_step)
             else:
-                if writefile and current_output.point_added:
-                    #point written but not converged
-                    self.pacc_off(bdelete=True)
-                    self.pacc_on(savefile=filename)
-
-                if last_cl < cl_max and (last_cl > min_cl or angle > min_alfa):
-                    #passed minimum alfa or cl and dipped lower in cl indicates stall
-                    print "aborting at a = " + str(angle) + ": failed to converge after peaking"
-                    break
-
-                elif (last_cl > min_cl or angle > min_alfa):
-                    if skips < 2: #skips measures skipping after passing minimum alfa or cl
-                        if self.logs_on:
-                            self.divfile.write('\n' + str({'airfoil':self.airfoil, 're':self.re, 'a': angle}))
-                        skips += 1
-                        print "skipping a = " + str(angle) + ": skips so far: " + str(skips)
-                    else:
-                        print "Aborting at a = " + str(last_converged) + ": failed to converge after two skips"
-                        break
-
+                state = polarstate(self.airfoil, self.re, angle, alfa_step, min_alfa, min_cl, writefile, self.divrecord)
+            state.zero_method, state.zero_solves = self.zero_method, self.zero_solves
+        if warmed:
+            state.cl_max, state.cl_max_angle = max((cl, a) for a, cl in warmed)
+            state.last_cl = warmed[-1][1]
+        self.checkpoint = state
+        pending = []
+        batching = batch > 1 and not adaptive and resume == None
+        slope = None
+        converged = False #whether the last solve converged
+
+        while running:
+            if max_alfa != None and state.angle > max_alfa:
+                break
+            if batching and not pending:
+                pending = yield self.aseq(state.angle, state.angle + (batch - 1)*alfa_step, alfa_step)
+                state.solves += len(pending)
+                good = [o for o in pending if o.converged and (o.point_added or not writefile)]
+                if len(good) < max(2, len(pending)):
+                    batching = False
                 else:
-                    print "skipping a = " + str(angle) + ": failed to converge"
-                    self.divfile.write('\n' + str({'airfoil':self.airfoil, 're':self.re, 'a': angle}))
-
-            angle += alfa_step
+                    chunk_slope = (good[-1].lookup('CL') - good[0].lookup('CL'))/(good[-1].lookup('a') - good[0].lookup('a'))
+                    if slope == None:
+                        slope = chunk_slope
+                    elif chunk_slope < batch_slope*slope:
+                        batching = False
+            if pending:
+                current_output = pending.pop(0)
+            else:
+                current_output = yield self.alfa(state.angle)
+                state.solves += 1
+            converged = current_output.converged
+            if writefile and not current_output.converged and current_output.point_added:
+                #point written but not converged
+                yield self.pacc_off(bdelete=True)
+                yield self.pacc_on(savefile=filename)
+                #batched points after this one went to the deleted file
+                pending = []
+            if not state.update(current_output):
+                break
         
-        print "Exiting simulation at a = " + str(last_converged)
+        print "Exiting simulation at a = " + str(state.last_converged)
+        self.divrecord('end', self.airfoil, self.re, state.last_converged)
         if self.bpacc:
-            self.pacc_off()
-        self.init()
+            savefile = os.path.join(self.output_dir, self.polar_savefile)
+            yield self.pacc_off()
+            if pending:
+                #ASEQ ran past the point where stepping stopped
+                trim_polar(savefile, state.angle + alfa_step/2.)
+            if adaptive:
+                #CLmax refinement steps back below the last points
+                sort_polar(savefile)
+        self.checkpoint = None
+        if not (warm and converged):
+            yield self.init()
+        raise Return(state)
              
+    @coroutine
     def quit(self):
         """Stops the xfoil process associated with this session."""
-        self.force_menu('xfoil')
+        yield self.force_menu('xfoil')
         self.proc.sendline('quit')
-        self.proc.close() 
-        os.chdir(self.cwd)
-        if self.logs_on:
-            self.divfile.close()
+        self.force_quit()
 
     def force_quit(self):
-        """Force closes the session without sending quit command"""
+        """Force closes the session without sending quit command (not a coroutine)"""
         self.proc.close()
-        os.chdir(self.cwd)
+        if self.changed_dir:
+            os.chdir(self.cwd)
         if self.logs_on:
             self.divfile.close()
+        self.dump_stats()
+
+    def telemetry(self, state=None):
+        """Solve counts, zero finding and diverged angles of the last polar, for the run log
+
+        :param state: the polar's final :py:class:`polarstate`, or None if CL could not be zeroed
+        :returns: dict
+        """
+        if state == None:
+            return {'solves': self.zero_solves, 'zero_method': self.zero_method, 'zero_solves': self.zero_solves,
+                    'points': 0, 'last_alfa': None, 'diverged': []}
+        return state.telemetry()
+
+    def dump_stats(self):
+        """Write the command stats, if on, as JSON to :py:attr:`stats_file`"""
+        if self.stats != None:
+            self.stats.dump(self.stats_file)
+
+class commandstats:
+    """Count, total time and latency histogram of the commands sent by a :py:class:`session`
+
+    Commands are grouped by the session method that sent them, eg 'alfa', 'set_re', 'pacc_on' or
+    'force_menu' for menu navigation.  Time spent waiting for xfoil's prompt is kept apart from time
+    spent parsing its output in :py:class:`output`, to tell whether a slow sweep is bound by the
+    solver or by the driver.
+    """
+    #upper bounds of the histogram bins, in seconds; the last bin is open
+    bins = [.001, .002, .005, .01, .02, .05, .1, .2, .5, 1, 2, 5, 10, 30]
+
+    def __init__(self):
+        self.commands = dict()
+        self.last = None
+
+    def waited(self, kind, seconds):
+        """Account for a command of kind that took seconds to return xfoil's prompt"""
+        if kind not in self.commands:
+            self.commands[kind] = {'count': 0, 'wait': 0., 'parse': 0., 'histogram': [0]*(len(self.bins) + 1)}
+        entry = self.commands[kind]
+        entry['count'] += 1
+        entry['wait'] += seconds
+        entry['histogram'][bisect.bisect_left(self.bins, seconds)] += 1
+        self.last = kind
+
+    def parsed(self, seconds):
+        """Account for seconds spent parsing the output of the last command"""
+        if self.last != None:
+            self.commands[self.last]['parse'] += seconds
+
+    def summary(self):
+        return {'bins': self.bins,
+                'wait': sum(c['wait'] for c in self.commands.values()),
+                'parse': sum(c['parse'] for c in self.commands.values()),
+                'commands': self.commands}
+
+    def dump(self, path):
+        f = open(path, 'w')
+        json.dump(self.summary(), f, indent=1, sort_keys=True)
+        f.close()
  
+class polarstate:
+    """Stall detection state of a polar being stepped in alfa from zero lift
+
+    :py:func:`session.generate_polar` feeds the output for :py:attr:`angle` to :py:func:`update` until it returns False.
+    The session keeps its current polarstate as :py:attr:`session.checkpoint`, so a polar interrupted by a timeout can be resumed by another session.
+
+    :param divrecord: called with a kind, the airfoil, Re and angle of each point that did not make it into the polar
+    """
+    def __init__(self, airfoil, re, angle, alfa_step=.5, min_alfa=4, min_cl=0.4, writefile=True, divrecord=None):
+        self.airfoil = airfoil
+        self.re = re
+        self.angle = angle
+        self.alfa_step = alfa_step
+        self.min_alfa = min_alfa
+        self.min_cl = min_cl
+        self.writefile = writefile
+        self.divrecord = divrecord or (lambda kind, airfoil, re, a=None: None)
+        self.cl_max_angle = 90
+        self.cl_max = -100
+        self.last_converged = angle
+        self.last_cl = -100
+        self.skips = 0
+        self.points = 0
+        self.solves = 0
+        self.diverged = [] #angles that did not make it into the polar
+        self.zero_method = None
+        self.zero_solves = 0
+
+    def record(self, kind='diverged'):
+        self.diverged.append(self.angle)
+        self.divrecord(kind, self.airfoil, self.re, self.angle)
+
+    def telemetry(self):
+        """:returns: dict of the solves, zero finding, points and diverged angles of the polar so far"""
+        return {'solves': self.zero_solves + self.solves, 'zero_method': self.zero_method, 'zero_solves': self.zero_solves,
+                'points': self.points, 'last_alfa': self.last_converged, 'diverged': list(self.diverged)}
+
+    def update(self, out):
+        """Account for the output at :py:attr:`angle` and step to the next angle
+
+        :param out: xfoil's output for :py:attr:`angle`
+        :type out: :py:class:`output`
+        :returns: bool -- False once the polar should stop; :py:attr:`angle` is then the angle it stopped at
+        """
+        angle = self.angle
+        if not out.converged:
+            return self.failed()
+
+        if self.writefile and not out.point_added:
+            self.skips = 0
+            self.last_converged = angle
+            self.last_cl = out.lookup('CL')
+            self.record('unrecorded')
+            print "failed to record to polar: a = " + str(angle)
+            self.angle += self.alfa_step
+            return True
+
+        return self.added(out.lookup('CL'))
+
+    def added(self, cl):
+        """Account for a point at :py:attr:`angle` that converged at cl and made it into the polar
+
+        :returns: bool -- False once the polar should stop
+        """
+        angle = self.angle
+        self.skips = 0
+        #update cl_max_angle
+        self.last_converged = angle
+        self.last_cl = cl
+
+        self.points += 1
+        past_min = self.last_cl > self.min_cl or angle > self.min_alfa
+        if self.last_cl > self.cl_max:
+            self.cl_max = self.last_cl
+            self.cl_max_angle = angle
+        elif past_min and self.last_cl < self.cl_max - .05:
+            print "aborting at cl = " + str(self.last_cl) + ", a = " + str(angle) + ": past peak " + str(self.cl_max) + ", " + str(self.cl_max_angle)
+            return False
+        elif past_min and angle > 1 + self.cl_max_angle:
+            print "aborting at cl = " + str(self.last_cl) + ", a = " + str(angle) + ": past peak " + str(self.cl_max) + ", " + str(self.cl_max_angle)
+            return False
+
+        self.angle += self.alfa_step
+        return True
+
+    def replay(self, points):
+        """Account for points written to the polar from :py:attr:`angle` on without passing through :py:func:`update`
+
+        Angles between them that are missing did not converge.
+
+        :param points: (alfa, CL) of each point, in order of alfa
+        :returns: bool -- False once the polar should stop; :py:attr:`angle` is then the angle it stopped at
+        """
+        for a, cl in points:
+            if a < self.angle - self.alfa_step/2.:
+                continue
+            while a > self.angle + self.alfa_step/2.:
+                if not self.failed():
+                    return False
+            if not self.added(cl):
+                return False
+        return True
+
+    def failed(self):
+        """Account for a point at :py:attr:`angle` that did not converge, or timed out
+
+        :returns: bool -- False once the polar should stop
+        """
+        angle = self.angle
+        past_min = self.last_cl > self.min_cl or angle > self.min_alfa
+        if self.last_cl < self.cl_max and past_min:
+            #passed minimum alfa or cl and dipped lower in cl indicates stall
+            print "aborting at a = " + str(angle) + ": failed to converge after peaking"
+            return False
+
+        elif past_min:
+            if self.skips < 2: #skips measures skipping after passing minimum alfa or cl
+                self.record()
+                self.skips += 1
+                print "skipping a = " + str(angle) + ": skips so far: " + str(self.skips)
+            else:
+                print "Aborting at a = " + str(self.last_converged) + ": failed to converge after two skips"
+                return False
+
+        else:
+            print "skipping a = " + str(angle) + ": failed to converge"
+            self.record()
+
+        self.angle += self.alfa_step
+        return True
+
+class adaptivestate(polarstate):
+    """A polarstate that steps alfa by the CL slope and refines CLmax once stall is found
+
+    Steps shrink from alfa_step towards min_step in proportion to the CL slope
+    relative to the slope at the start of the polar, and are halved after a
+    point fails to converge.  Once the usual stall checks stop the polar, the
+    vertex of a parabola through the highest CL and its two neighbours is
+    solved, up to refinements times while the vertex is more than min_step/2
+    from every angle already solved.  Angles are therefore not monotonic; the
+    polar file is sorted afterwards.
+    """
+    def __init__(self, airfoil, re, angle, alfa_step=2., min_alfa=4, min_cl=0.4, writefile=True, divrecord=None, min_step=.1, refinements=3):
+        polarstate.__init__(self, airfoil, re, angle, alfa_step, min_alfa, min_cl, writefile, divrecord)
+        self.min_step = min_step
+        self.refinements = refinements
+        self.step = alfa_step
+        self.slope = None
+        self.history = [] #(alfa, CL) of every point in the polar
+        self.tried = [] #refinement angles that did not converge
+        self.refining = False
+
+    def update(self, out):
+        angle = self.angle
+        points = self.points
+        if self.refining:
+            if out.converged and (out.point_added or not self.writefile):
+                cl = out.lookup('CL')
+                self.history.append((angle, cl))
+                self.points += 1
+                if cl > self.cl_max:
+                    self.cl_max = cl
+                    self.cl_max_angle = angle
+            else:
+                self.record()
+            return self.refine()
+        if not polarstate.update(self, out):
+            if self.points > points:
+                self.history.append((angle, self.last_cl))
+            return self.refine()
+        if not out.converged:
+            return True #failed() has stepped already
+        if self.points > points:
+            self.history.append((angle, self.last_cl))
+        self.angle = round(angle + self.next_step(), 3)
+        return True
+
+    def failed(self):
+        angle = self.angle
+        if self.refining:
+            self.record()
+            return self.refine()
+        if not polarstate.failed(self):
+            return self.refine()
+        self.step = max(self.min_step, self.step/2.)
+        self.angle = round(angle + self.step, 3)
+        return True
+
+    def next_step(self):
+        if len(self.history) >= 2:
+            (a0, cl0), (a1, cl1) = self.history[-2:]
+            slope = (cl1 - cl0)/(a1 - a0)
+            if self.slope == None:
+                self.slope = slope
+            if self.slope > 0:
+                self.step = min(self.alfa_step, max(self.min_step, self.alfa_step*slope/self.slope))
+        return self.step
+
+    def refine(self):
+        """Move :py:attr:`angle` to the next CLmax refinement
+
+        :returns: bool -- False once CLmax is resolved to min_step or cannot be bracketed
+        """
+        self.refining = True
+        points = sorted(self.history)
+        if self.refinements <= 0 or len(points) < 3:
+            return False
+        peak = max(range(len(points)), key=lambda i: points[i][1])
+        if peak == 0 or peak == len(points) - 1:
+            return False
+        (a0, c0), (a1, c1), (a2, c2) = points[peak - 1:peak + 2]
+        denom = (a0 - a1)*(a0 - a2)*(a1 - a2)
+        A = (a2*(c1 - c0) + a1*(c0 - c2) + a0*(c2 - c1))/denom
+        B = (a2**2*(c0 - c1) + a1**2*(c2 - c0) + a0**2*(c1 - c2))/denom
+        if A >= 0:
+            return False
+        vertex = round(-B/(2*A), 3)
+        if min(abs(vertex - a) for a in [a for a, cl in points] + self.tried) < self.min_step/2.:
+            return False
+        self.refinements -= 1
+        self.tried.append(vertex)
+        print "refining CLmax at a = " + str(vertex)
+        self.angle = vertex
+        return True
+
+_splitstr = '\r\n\r\n'
+_iter_pattern = regexp.compile(r'(\d+) +rms:')
+_value_pattern = regexp.compile(r'(\w+) ?[=:] +(-?(?:\d+\.?\d*|\.\d+)(?:E[-+]?\d+)?)')
+
 class output:
     """A class for processing and parsing xfoil output
 
     Instances of :py:class:`output` are obtained as return values from the :py:class:`session` methods :py:func:`alfa` and :py:func:`cl`.
+
+    Only the last three paragraphs of the buffer are examined, and all variables are parsed together on the first :py:func:`lookup`.
     """
     def __init__(self, str):
         self.raw = str
-        splitstr = '\r\n\r\n'
+        self._values = None
         last3 = []
+        end = len(str)
         for i in range(0,3,1):
-            parts = str.rpartition(splitstr)
-            last3.append(parts[2])
-            str = parts[0] 
+            start = str.rfind(_splitstr, 0, end)
+            if start < 0:
+                last3.append(str[:end])
+                end = 0
+            else:
+                last3.append(str[start + len(_splitstr):end])
+                end = start
         self.menu = last3[0].strip()
         if('rms:' in last3[1]):
             self.point_added = False
@@ -517,6 +1194,20 @@ class output:
         """:returns: bool telling whether or not xfoil converged"""
         return self.converged 
 
+    @property
+    def values(self):
+        """:returns: :py:class:`point` -- every variable in :py:attr:`session.varlist`, parsed in one pass"""
+        if self._values is None:
+            values = point()
+            found = _iter_pattern.search(self.data)
+            if found:
+                values.iter = int(found.group(1))
+            for var, num in _value_pattern.findall(self.data):
+                if var in point.__slots__ and not hasattr(values, var):
+                    setattr(values, var, float(num))
+            self._values = values
+        return self._values
+
     def lookup(self, var):
         """Look up the value of a variable in xfoil's output
         
@@ -534,15 +1225,57 @@ class output:
 
         :type var: str
         :returns: float -- the value of the variable.
-        :raises: :py:class:`XfoilError`, if xfoil did not converge.
+        :raises: :py:class:`XfoilError`, if the variable is not in the output.
         """
         #if(not self.converged):
         #    raise XfoilError('Attempt to look up '+var+' on unconverged output')
-        if(var == 'iter'):
-            return int(regexp.search(' *\d+ ', self.data).group())
-        else:
-            res = regexp.search(var+' ?[=:] +-?\d*[.]\d*E?-?\d*', self.data).group()
-            return float(res.split(' ')[-1])
+        try:
+            return getattr(self.values, var)
+        except AttributeError:
+            raise XfoilError('Could not find ' + var + ' in output.')
+
+class point(object):
+    """Compact record of the variables in one xfoil output, see :py:attr:`output.values`"""
+    __slots__ = ('iter', 'rms', 'max', 'a', 'CL', 'Cm', 'CD', 'CDf', 'CDp')
+
+    def asdict(self):
+        return dict((var, getattr(self, var)) for var in self.__slots__ if hasattr(self, var))
+
+def split_outputs(str):
+    """Split the output of a multi-point command such as ASEQ into one :py:class:`output` per point
+
+    XFOIL prints each iteration as its own paragraph; a point ends when a
+    'Point added' paragraph follows or the iteration count starts over.
+    """
+    blocks = str.split(_splitstr)
+    menu = blocks[-1]
+    points = []
+    last_iter = None
+    for block in blocks[:-1]:
+        if 'rms:' in block:
+            found = _iter_pattern.search(block)
+            n = int(found.group(1)) if found else None
+            if last_iter is None or n is None or n <= last_iter:
+                points.append([block])
+            else:
+                points[-1][0] = block
+            last_iter = n
+        elif 'Point added' in block and points:
+            points[-1].append(block)
+            last_iter = None
+    return [output(_splitstr.join(p + [menu])) for p in points]
+
+def trim_polar(filename, max_alfa):
+    """Remove points above max_alfa from a saved polar file"""
+    lines = open(filename, 'r').readlines()
+    kept = lines[:12] + [l for l in lines[12:] if l.strip() == '' or float(l.split()[0]) < max_alfa]
+    open(filename, 'w').write(''.join(kept))
+
+def sort_polar(filename):
+    """Sort the points of a saved polar file by alfa"""
+    lines = open(filename, 'r').readlines()
+    points = sorted((l for l in lines[12:] if l.strip() != ''), key=lambda l: float(l.split()[0]))
+    open(filename, 'w').write(''.join(lines[:12] + points))
 
 class XfoilError(Exception):
     """An exception raised by pyxfoil"""
@@ -1,12 +1,24 @@
-import datetime
+import datetime, time, json, math
+import numpy
 
 def getnowstr():
     now = datetime.datetime.now()
     return str(now.month) + '/' + str(now.day) + '/' + str(now.year) + '-' + str(now.hour).zfill(2) + ':' + str(now.minute).zfill(2) + ':' + str(now.second).zfill(2)
 
 class runlog():
-    def __init__(self, logfile):
+    """
+    The session log of a run: free text comments, plus a stream of JSON events, one per line,
+    for every polar run.  Events are buffered and written every buffer events and on close.
+
+    @param logfile   open text log file
+    @param eventfile open file the JSON events are appended to, None to keep no events
+    @param buffer    number of events held before they are written
+    """
+    def __init__(self, logfile, eventfile=None, buffer=20):
         self.logfile = logfile
+        self.eventfile = eventfile
+        self.buffer = buffer
+        self.events = []
         self.logfile.write('#'*50 + '\n')
         self.logfile.write('Log opened ' + getnowstr() + '\n')
         self.logfile.write('-'*50 + '\nComments\n\n')
@@ -22,6 +34,33 @@ class runlog():
     def timeout(self, airfoil, re):
         self.comment("XFOIL timed out at airfoil=" + str(airfoil) + " Re=" + str(re))
 
+    def event(self, kind, **fields):
+        """Queues a JSON event of kind with fields and the time"""
+        fields.update(kind=kind, time=time.time())
+        self.events.append(fields)
+        if len(self.events) >= self.buffer:
+            self.flush()
+
+    def polar(self, airfoil, re, status, seconds, telemetry=None, timeouts=0, restarts=0, kind='polar', **fields):
+        """
+        Queues the event for one polar
+
+        @param status    'complete', 'recovered', 'cached', 'timeout' or 'failed'
+        @param seconds   wall time, including timeouts and restarts
+        @param telemetry dict from session.telemetry(): solves, zero finding and diverged angles
+        @param timeouts  number of times XFOIL timed out
+        @param restarts  number of times the polar was resumed from its checkpoint in a fresh XFOIL
+        """
+        fields.update(telemetry or {})
+        self.event(kind, airfoil=airfoil, re=re, status=status, seconds=seconds, timeouts=timeouts,
+                   restarts=restarts, **fields)
+
+    def flush(self):
+        if self.eventfile != None and self.events:
+            self.eventfile.write(''.join(json.dumps(e) + '\n' for e in self.events))
+            self.eventfile.flush()
+        self.events = []
+
     def sweep_param(self, airfoils=[], res=[]):
         self.airfoils += airfoils
         self.res += res
@@ -84,6 +123,71 @@ class runlog():
 
         self.logfile.write('\n' + '-'*50 + '\nLog closed at ' + getnowstr() + '\n')
         self.logfile.close()
+        self.flush()
+        if self.eventfile != None:
+            self.eventfile.close()
+
+def read_events(path, kinds=('polar', 'fill')):
+    """Returns the events of the given kinds from a run's event file"""
+    events = []
+    for line in open(path):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue #a line cut short by a crash
+        if event.get('kind') in kinds:
+            events.append(event)
+    return events
+
+def _family(airfoil):
+    """NACA 4-digit family, by camber and camber position: 2412 -> 24xx"""
+    return str(airfoil)[:2] + 'xx'
+
+def _decade(re):
+    return '1e' + str(int(math.floor(math.log10(re))))
+
+def _table(title, groups, seconds):
+    """Text table of count, total, median, 90th percentile and max seconds per group"""
+    s = title.ljust(10) + 'polars'.rjust(8) + 'total s'.rjust(10) + 'median s'.rjust(10) + 'p90 s'.rjust(10) + 'max s'.rjust(10) + '\n'
+    for group in sorted(set(groups)):
+        times = seconds[groups == group]
+        s += (str(group).ljust(10) + str(len(times)).rjust(8) + ('%.1f' % times.sum()).rjust(10)
+              + ('%.2f' % numpy.median(times)).rjust(10) + ('%.2f' % numpy.percentile(times, 90)).rjust(10)
+              + ('%.2f' % times.max()).rjust(10) + '\n')
+    return s
+
+def report(events, slowest=10):
+    """
+    Summarizes polar events: throughput, cost per airfoil family and Re decade, and the slowest polars
+    Cached polars count towards throughput only.
+    Returns the report as text.
+    """
+    if not events:
+        return "No polars logged.\n"
+    times = numpy.array([e['time'] for e in events])
+    span = times.max() - times.min() + events[int(times.argmin())]['seconds']
+    run = [e for e in events if e['status'] != 'cached']
+    s = (str(len(events)) + " polars (" + str(len(events) - len(run)) + " cached) over " + str(round(span/60., 1))
+         + " minutes: " + str(round(len(events)/max(span, 1e-9)*3600, 1)) + " polars per hour\n")
+    if not run:
+        return s
+    seconds = numpy.array([e['seconds'] for e in run])
+    solves = numpy.array([e.get('solves', 0) for e in run])
+    s += ("XFOIL time " + str(round(seconds.sum()/3600., 2)) + " hours in " + str(solves.sum()) + " solves, "
+          + str(round(seconds.sum()/max(1, solves.sum()), 3)) + " seconds per solve\n")
+    s += ("Timeouts: " + str(sum(e['timeouts'] for e in run)) + ", restarts: " + str(sum(e['restarts'] for e in run))
+          + ", failed: " + str(sum(e['status'] in ('failed', 'timeout') for e in run))
+          + ", diverged angles: " + str(sum(len(e.get('diverged', [])) for e in run)) + "\n")
+    methods = [str(e.get('zero_method')) for e in run]
+    s += "Zero lift: " + ', '.join(m + ' ' + str(methods.count(m)) for m in sorted(set(methods))) + "\n\n"
+    s += _table('family', numpy.array([_family(e['airfoil']) for e in run]), seconds) + '\n'
+    s += _table('Re', numpy.array([_decade(e['re']) for e in run]), seconds) + '\n'
+    s += 'Slowest polars:\n'
+    for e in sorted(run, key=lambda e: -e['seconds'])[:slowest]:
+        s += ('  NACA ' + str(e['airfoil']) + ' Re ' + str(int(e['re'])).rjust(9) + ('%.2f s' % e['seconds']).rjust(10)
+              + str(e.get('solves', 0)).rjust(6) + ' solves  ' + e['status'] + ', zero ' + str(e.get('zero_method'))
+              + ', ' + str(len(e.get('diverged', []))) + ' diverged, ' + str(e['timeouts']) + ' timeouts\n')
+    return s
 
 #import numpy
 #Nacas = [a + str(b).zfill(2) for a in ['00','14','24','34','44'] for b in range(8,17)]
@@ -0,0 +1,64 @@
+import math, heapq
+import numpy
+
+default_seconds = 10. #predicted for every polar until a run has timings
+
+def features(airfoil, re):
+    """Regression features of a polar: log Re and, for NACA 4-digit airfoils, camber, camber position and thickness"""
+    if len(airfoil) == 4 and airfoil.isdigit():
+        return [1., math.log10(re), int(airfoil[0]), int(airfoil[1]), int(airfoil[2:])]
+    return [1., math.log10(re), 0., 0., 0.]
+
+class costmodel():
+    """
+    Predicts how long a polar will take from the timings of earlier polars
+    A polar timed before is predicted by the median of its own timings; any other
+    is predicted by a least squares fit of log seconds to :py:func:`features`,
+    once there are enough timings to fit, or by their geometric mean.
+
+    @param timings list of (airfoil, re, seconds), e.g. from catalog.timings()
+    """
+    def __init__(self, timings):
+        self.exact = dict()
+        for airfoil, re, seconds in timings:
+            self.exact.setdefault((airfoil, float(re)), []).append(seconds)
+        self.coefficients = None
+        self.mean = None
+        timings = [t for t in timings if t[2] > 0]
+        if timings:
+            logs = numpy.log([seconds for airfoil, re, seconds in timings])
+            self.mean = logs.mean()
+            X = numpy.array([features(airfoil, re) for airfoil, re, seconds in timings])
+            if len(timings) >= 2*X.shape[1]:
+                self.coefficients = numpy.linalg.lstsq(X, logs, rcond=-1)[0]
+
+    def predict(self, airfoil, re):
+        """Returns the expected seconds for the polar of airfoil at re"""
+        if (airfoil, float(re)) in self.exact:
+            return float(numpy.median(self.exact[(airfoil, float(re))]))
+        if self.coefficients is not None:
+            return float(math.exp(numpy.dot(features(airfoil, re), self.coefficients)))
+        if self.mean is not None:
+            return float(math.exp(self.mean))
+        return default_seconds
+
+def schedule(jobs, model):
+    """
+    Sets each job's 'predicted' seconds and returns the jobs longest expected first,
+    so the slowest polars do not land at the end of a sweep with cores idle
+
+    @param jobs list of job dicts with 'airfoil' and 're'
+    """
+    for job in jobs:
+        job['predicted'] = model.predict(job['airfoil'], job['re'])
+    return sorted(jobs, key=lambda job: -job['predicted'])
+
+def estimate(jobs, workers=1):
+    """
+    Returns the expected seconds to run the scheduled jobs on workers workers,
+    dealing each job in order to the worker that frees up first
+    """
+    finish = [0.]*max(1, workers)
+    for job in jobs:
+        heapq.heapreplace(finish, finish[0] + job['predicted'])
+    return max(finish)
@@ -0,0 +1,118 @@
+import threading, time, Queue
+import pexpect
+import pyxfoil
+
+class sessionpool():
+    """
+    Keeps configured XFOIL sessions warm so sweeps and recoveries do not pay
+    for spawning and setting up XFOIL each time.
+    Broken sessions are replaced on a background thread.
+
+    @param run_dir directory containing logs/ and savedpolars/
+    @param size    number of sessions to keep ready
+    @param panels  number of airfoil panels sessions are set up with
+    @param zeros   zerocache given to every session, None to zero without estimates
+    @param wait    seconds get() waits for a background replacement before spawning a session itself
+    """
+    def __init__(self, run_dir, size=2, panels=200, zeros=None, wait=30.):
+        self.run_dir = run_dir
+        self.wait = wait
+        self.panels = panels
+        self.zeros = zeros
+        self.ready = Queue.Queue()
+        self.spawned = 0
+        self.replaced = 0
+        self.lock = threading.Lock()
+        self.threads = []
+        for _ in range(size):
+            self.ready.put(self.spawn())
+
+    def spawn(self):
+        with self.lock:
+            self.spawned += 1
+            tag = str(self.spawned)
+        xf = pyxfoil.session(logfile='pool' + tag, run_dir=self.run_dir, force_zero=True)
+        xf.zeros = self.zeros
+        xf.naca('0010')
+        xf.set_panels(self.panels)
+        return xf
+
+    def _replace(self):
+        try:
+            self.ready.put(self.spawn())
+        except (pexpect.ExceptionPexpect, pyxfoil.XfoilError) as e:
+            print "Could not replace XFOIL session: " + str(e)
+
+    def replace(self):
+        """Starts a fresh session on a background thread"""
+        self.replaced += 1
+        thread = threading.Thread(target=self._replace)
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def ensure(self, size):
+        """Starts sessions until at least size are ready"""
+        while self.ready.qsize() < size:
+            self.ready.put(self.spawn())
+
+    def get(self, div_filename='divergence.log', plots=False, panels=None):
+        """
+        Hands out a ready session
+        If none is ready, replacements still being started are waited for, up to the pool's
+        wait seconds; once they have failed or the wait is over, a session is spawned here,
+        so its errors reach the caller.
+
+        @param div_filename divergence log the session should write to
+        @param plots        boolean indicating whether or not to simulate with plots on
+        @param panels       number of airfoil panels, defaults to the pool's
+        """
+        xf = None
+        deadline = time.time() + self.wait
+        while xf == None:
+            replacing = any(thread.is_alive() for thread in self.threads)
+            try:
+                xf = self.ready.get(replacing, .1)
+            except Queue.Empty:
+                if not replacing or time.time() > deadline:
+                    xf = self.spawn()
+        xf.set_divfile(div_filename)
+        if plots:
+            xf.plots_on()
+        else:
+            xf.plots_off()
+        xf.set_panels(panels or self.panels)
+        return xf
+
+    def put(self, xf):
+        """
+        Returns a session to the pool after checking it still answers
+        Sessions that fail the check are discarded and replaced
+        """
+        try:
+            if not xf.proc.isalive():
+                raise pexpect.EOF('XFOIL exited')
+            if xf.bpacc:
+                xf.pacc_off()
+            xf.force_menu('xfoil')
+            xf.send('', timeout=5)
+        except (pexpect.ExceptionPexpect, pyxfoil.XfoilError):
+            self.discard(xf)
+            return
+        self.ready.put(xf)
+
+    def discard(self, xf):
+        """Force closes a broken session and starts its replacement"""
+        xf.force_quit()
+        self.replace()
+
+    def close(self):
+        """Quits every session in the pool"""
+        for thread in self.threads:
+            thread.join()
+        while not self.ready.empty():
+            xf = self.ready.get()
+            try:
+                xf.quit()
+            except pexpect.ExceptionPexpect:
+                xf.force_quit()
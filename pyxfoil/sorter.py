@@ -1,27 +1,24 @@
-import os, sys
+import os, sys, bisect
+import polarfile, divlog
 
 cwd = os.getcwd() + '/'
 
 def parse_polar_name(polarname):
-    airfoil = polarname[4:8]
-    re = int(polarname[11:19])*1000
+    airfoil, rest = polarname[4:].split('_Re', 1)
+    re = int(rest[:8])*1000
     return airfoil, re
 
 def get_last_point(filename, filepath=cwd+'savedpolars/'):
-    polar = open(filepath + filename, "r")
-    lines = polar.readlines()
-    return float(lines[-2].rstrip().split()[0])
+    last = polarfile.last_point(filepath + filename)
+    if last is None:
+        raise ValueError(filename + " has no points")
+    return last
 
 def cutoff_generator(threshold):
     def f(dct):
         return dct['a'] < threshold
     return f
 
-def startswith_generator(prefix, invert=False):
-    def f(string):
-        return invert != string.startswith(prefix)
-    return f
-
 def contains_generator(substring, invert=False):
     def f(string):
         return invert != substring in string
@@ -49,22 +46,18 @@ def dir_to_dict(polardir):
             continue
     return polars
 
-def file_to_dict(filepath, prefix=None, strip=False):
+def file_to_dict(filepath, kinds=('diverged',)):
+    """
+    Returns {airfoil: {re: sorted list of alfas}} of the records of the given kinds in a divergence log
+    Airfoil, Re pairs with records but no alfas (failed zeros) get an empty list.
+    """
     polars = dict()
-    contents = [line.rstrip() for line in file(filepath, 'r').readlines()]
-    filtered = filter(startswith_generator(prefix), contents)
-    for line in filtered:
-        if strip:
-            line = line.strip(prefix)
-        literal = eval(line)
-
-        if literal['airfoil'] not in polars:
-            polars[literal['airfoil']] = dict()
-        if literal['re'] not in polars[literal['airfoil']]:
-            polars[literal['airfoil']][literal['re']] = list()
-        if 'a' in literal:
-            polars[literal['airfoil']][literal['re']].append(round(literal['a'], 3))
-            polars[literal['airfoil']][literal['re']] = sorted(polars[literal['airfoil']][literal['re']])
+    for kind, airfoil, re, a in divlog.read(filepath):
+        if kind not in kinds:
+            continue
+        alfas = polars.setdefault(airfoil, dict()).setdefault(re, list())
+        if a != None:
+            bisect.insort(alfas, a)
     return polars
 
 def dict_to_list(polardict):
@@ -0,0 +1,119 @@
+import os, threading
+import numpy
+import pexpect
+import pyxfoil, polarfile
+
+def split_ranges(start, sessions, alfa_step=.5, span=16.):
+    """
+    Splits the alfas from start into one range per session
+    Returns a list of (first alfa, last alfa) with the last range open ended (None)
+
+    @param span expected alfa range from zero lift to stall, shared out evenly
+    """
+    chunk = alfa_step*max(1, int(round(span/sessions/alfa_step)))
+    firsts = [start + i*chunk for i in range(sessions)]
+    return [(first, first + chunk - alfa_step/2.) for first in firsts[:-1]] + [(firsts[-1], None)]
+
+def _run_range(xf, airfoil, re, first, last, warm_from, polar_args, results, i):
+    try:
+        xf.naca(airfoil)
+        xf.set_re(re)
+        warmed = None
+        if warm_from != None:
+            #converge the BL up through the last few angles below the range without recording, instead
+            #of starting cold, and detect stall within the range from their CLmax on
+            if xf.bpacc:
+                xf.pacc_off()
+            step = polar_args['alfa_step']
+            outs = xf.aseq(warm_from, first - step, step)
+            warmed = [(out.lookup('a'), out.lookup('CL')) for out in outs if out.converged]
+        state = xf.generate_polar(start_value=first, max_alfa=last, warmed=warmed, **polar_args)
+        results[i] = {'state': state, 'timeout': False}
+    except pexpect.ExceptionPexpect:
+        print "XFOIL timed out in the range from a = " + str(first)
+        results[i] = {'state': None, 'timeout': True}
+    except pyxfoil.XfoilError as e:
+        print "Range from a = " + str(first) + " failed: " + str(e)
+        results[i] = {'state': None, 'timeout': False}
+    except Exception as e:
+        #the session is in an unknown state, so it is discarded like a timed out one
+        print "Range from a = " + str(first) + " failed: " + repr(e)
+        results[i] = {'state': None, 'timeout': True}
+
+def generate_split(pool, airfoil, re, filename, sessions=3, alfa_step=.5, min_alfa=4, min_cl=0.4, span=16.,
+                   div_filename='divergence.log', plots=False, panels=None, overlap=3):
+    """
+    Generates one polar on several pooled sessions at once
+    One session finds the angle of zero lift, then each session steps its own
+    range of alfas on its own thread into a partial polar.  Every range but
+    the first is warmed up by sequencing through the overlap angles below it.
+    The partial polars are stitched into filename in order, carrying the
+    stall state of the ranges below through the points of each range, up to
+    where that state stalls or the first range that stalled or timed out.
+    Returns the number of points in the polar, or None if CL could not be zeroed.
+
+    @param pool     sessionpool the sessions are drawn from and returned to
+    @param sessions number of sessions, and alfa ranges
+    @param span     expected alfa range from zero lift to stall, split between the sessions
+    @param overlap  number of alfa steps each range but the first is warmed up through
+    """
+    pool.ensure(sessions)
+    xfs = [pool.get(div_filename=div_filename, plots=plots, panels=panels)]
+    xfs[0].naca(airfoil)
+    xfs[0].set_re(re)
+    start = xfs[0].start_angle()
+    if start == None:
+        pool.put(xfs[0])
+        return None
+    xfs += [pool.get(div_filename=div_filename, plots=plots, panels=panels) for _ in range(sessions - 1)]
+
+    ranges = split_ranges(start, sessions, alfa_step, span)
+    parts = [filename + '.part' + str(i) for i in range(sessions)]
+    polar_args = {'alfa_step': alfa_step, 'min_alfa': min_alfa, 'min_cl': min_cl}
+    results = [{'state': None, 'timeout': True} for _ in range(sessions)] #until each range's thread records its own
+    threads = []
+    for i, (xf, (first, last)) in enumerate(zip(xfs, ranges)):
+        warm_from = max(start, first - overlap*alfa_step) if i > 0 else None
+        thread = threading.Thread(target=_run_range, args=(xf, airfoil, re, first, last, warm_from,
+                                                           dict(polar_args, filename=parts[i]), results, i))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    for xf, result in zip(xfs, results):
+        if result['timeout']:
+            pool.discard(xf)
+        else:
+            pool.put(xf)
+
+    #each part is in its own session's output directory, all absolute
+    paths = [os.path.join(xf.output_dir, part) for xf, part in zip(xfs, parts)]
+    header, rows, carried = None, [], None
+    for (first, last), path, result in zip(ranges, paths, results):
+        state = result['state']
+        if state == None:
+            break #timed out or failed; only ranges that completed are stitched
+        data = numpy.zeros((0, len(polarfile.columns)))
+        if os.path.exists(path):
+            part_header, data = polarfile.read(path)
+            header = header or part_header
+        if carried == None:
+            carried = state
+            carried.divrecord = lambda kind, airfoil, re, a=None: None #its session logged them already
+        elif not carried.replay(data[:, :2].tolist()):
+            #stalled in this range as seen from the ranges below, which it only saw the overlap of
+            rows.append(data[data[:, 0] < carried.angle + alfa_step/2.])
+            break
+        rows.append(data)
+        if last == None or state.angle <= last:
+            break #stalled in this range, later ranges are past stall
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    if header == None:
+        return 0
+    data = numpy.concatenate(rows)
+    data = data[numpy.argsort(data[:, 0], kind='mergesort')]
+    polarfile.write(os.path.join(xfs[0].output_dir, filename), header, data)
+    return len(data)
@@ -0,0 +1,52 @@
+import os, math, time, sqlite3
+import polarcache
+
+def default_path():
+    return os.path.join(polarcache.default_dir(), 'zeros.db')
+
+class zerocache():
+    """
+    Zero lift angles found by earlier polars, keyed on airfoil geometry and Re,
+    used to seed :py:func:`pyxfoil.session.find_zero`.  Kept next to the polar
+    cache so estimates carry over between runs and worker processes.
+
+    @param dbpath database file, defaults to zeros.db in the polar cache directory
+    """
+    def __init__(self, dbpath=None):
+        self.dbpath = dbpath or default_path()
+        if not os.path.isdir(os.path.dirname(self.dbpath)):
+            os.makedirs(os.path.dirname(self.dbpath))
+        self.db = sqlite3.connect(self.dbpath, timeout=30)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS zeros (
+                               geometry TEXT, re REAL, alfa REAL, solves INTEGER, updated REAL,
+                               PRIMARY KEY (geometry, re))''')
+        self.db.commit()
+        self.lookups = 0
+        self.hits = 0
+        self.zeroed = 0
+        self.solves = 0
+
+    def estimate(self, geometry, re):
+        """Returns the zero lift angle found for geometry at the Re nearest re on a log scale, or None"""
+        self.lookups += 1
+        rows = self.db.execute('SELECT re, alfa FROM zeros WHERE geometry = ?', (geometry,)).fetchall()
+        if not rows:
+            return None
+        self.hits += 1
+        return min(rows, key=lambda row: abs(math.log(row[0]/float(re))))[1]
+
+    def record(self, geometry, re, alfa, solves):
+        """Stores the zero lift angle for geometry at re, found in solves XFOIL solves"""
+        self.zeroed += 1
+        self.solves += solves
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO zeros VALUES (?, ?, ?, ?, ?)',
+                            (geometry, re, alfa, solves, time.time()))
+
+    def report(self):
+        average = round(float(self.solves)/self.zeroed, 2) if self.zeroed else 0.0
+        return ("Zero lift: " + str(self.zeroed) + " polars zeroed in " + str(self.solves) + " solves (" + str(average)
+                + " per polar), " + str(self.hits) + " of " + str(self.lookups) + " seeded from earlier estimates.")
+
+    def close(self):
+        self.db.close()